@@ -1,14 +1,31 @@
+import hashlib
+import time
 from typing import Callable
 from fastapi import Depends, HTTPException, status
-from jose import JWTError, jwt
+from jose import JWTError
 from app.core.config import settings
 from app.db.session import get_db
 from app.db.schemas import UserDB
+from app.utils.async_jose import decode as async_jwt_decode
+from app.utils.auth_cache import get_token_user, token_cache
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/token")
 
+async def decode_cached_token(token: str) -> dict:
+    """Verify a JWT off the event loop once, then serve it from the token cache until it expires."""
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    payload = token_cache.get(token_hash)
+    if payload is not None:
+        return payload
+
+    payload = await async_jwt_decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    expires_in = payload["exp"] - time.time() if "exp" in payload else token_cache.ttl
+    if expires_in > 0:
+        token_cache.set(token_hash, payload, ttl=min(expires_in, token_cache.ttl))
+    return payload
+
 async def get_user_from_token(token: str, db: AsyncIOMotorDatabase):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -16,18 +33,19 @@ async def get_user_from_token(token: str, db: AsyncIOMotorDatabase):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = await decode_cached_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = await db["users"].find_one({"email": email})
+    # Cached per (email, token_version); tokens from before a password change are rejected
+    user = await get_token_user(email, payload.get("token_version", 0), db)
     if user is None:
         raise credentials_exception
     
-    return UserDB(**user)
+    return user
 
 # Dependency to get the current user
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncIOMotorDatabase = Depends(get_db)):
@@ -1,11 +1,13 @@
 import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from app.celery.tasks import send_email_confirmation_otp_email, send_password_reset_otp_email
 from app.db.schemas import ChangePasswordRequest, ResetPasswordRequest, SuccessResponse, UserCreate, UserDB, RefreshTokenRequest, VerifyOTPRequest
 from app.db.session import get_db
 from app.api.deps import user_permission, email_verified_user_permission
-from app.utils.auth_helpers import change_user_password, create_user_dict, get_password_hash, resend_and_save_otp, verify_otp_attempts, verify_password, create_access_token, create_refresh_token, decode_token, generate_otp
+from app.utils.auth_cache import invalidate_user
+from app.utils.email_outbox import enqueue_otp_email
+from app.utils.password_hashing import verify_and_update_password
+from app.utils.auth_helpers import change_user_password, create_user_dict, get_password_hash, resend_and_save_otp, verify_otp_attempts, create_access_token, create_refresh_token, decode_token, generate_otp
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 router = APIRouter()
@@ -24,18 +26,22 @@ async def register(user: UserCreate, db: AsyncIOMotorDatabase = Depends(get_db))
     user_dict = await create_user_dict(user, hashed_password)
 
     await db["users"].insert_one(user_dict)
-    send_email_confirmation_otp_email.delay(user.email, user_dict['otp'])
+    await enqueue_otp_email("email_confirmation", user.email, user_dict['otp'])
     return UserDB(**user_dict)
 
 @router.post("/token", response_model=dict)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncIOMotorDatabase = Depends(get_db)):
     user = await db["users"].find_one({"email": form_data.username})
-    if not user or not await verify_password(form_data.password, user["hashed_password"]):
+    valid, new_hash = await verify_and_update_password(form_data.password, user["hashed_password"]) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Upgrade hashes made with older argon2 parameters while the password is at hand
+        await db["users"].update_one({"email": user["email"]}, {"$set": {"hashed_password": new_hash}})
     access_token = await create_access_token(data={"sub": user["email"]}, token_version=user['token_version'])
     refresh_token = await create_refresh_token(data={"sub": user["email"]}, token_version=user['token_version'])
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
@@ -121,6 +127,9 @@ async def verify_otp(
         }
     )
 
+    # Cached sessions still carry email_verified=False
+    await invalidate_user(current_user.email)
+
     return {"detail": "Email successfully verified"}
 
 @router.post("/change-password", response_model=SuccessResponse)
@@ -157,7 +166,7 @@ async def request_password_reset(email: str, db: AsyncIOMotorDatabase = Depends(
             )
 
     # Generate a new OTP for password reset
-    otp = await generate_otp()
+    otp, _, _ = await generate_otp()
     otp_expires_at = current_time + datetime.timedelta(minutes=5)
 
     # Update the user record with the OTP, expiration time, and when the OTP was last sent
@@ -174,7 +183,7 @@ async def request_password_reset(email: str, db: AsyncIOMotorDatabase = Depends(
     )
 
     # Send the OTP to the user's email
-    send_password_reset_otp_email.delay(email, otp)
+    await enqueue_otp_email("password_reset", email, otp)
 
     return {"detail": "Password reset OTP has been sent to your email"}
 
@@ -226,6 +235,9 @@ async def reset_password(
         }
     )
 
+    # Drop cached sessions in every worker so old tokens stop working immediately
+    await invalidate_user(email)
+
     return {"detail": "Password has been reset successfully"}
 
 @router.get("/me", response_model=UserDB)
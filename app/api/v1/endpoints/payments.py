@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, Request, HTTPException
 from app.core.config import settings
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.db.session import get_db
+from app.utils.auth_cache import invalidate_user
 import stripe
 
 router = APIRouter()
@@ -37,6 +38,9 @@ async def stripe_webhook(request: Request, db: AsyncIOMotorDatabase = Depends(ge
             {"$inc": {"balance": amount_received}}  # Use $inc to increase the balance
         )
 
+        # Refresh cached balance snapshots so the top-up is usable immediately
+        await invalidate_user(user_email)
+
     elif event['type'] == 'payment_intent.payment_failed':
         # Handle failed payment here, if needed
         payment_intent = event['data']['object']
@@ -1,14 +1,102 @@
+import asyncio
 import base64
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header
+import json
+import time
+import uuid
+from typing import List
+from botocore.exceptions import ClientError
+from celery import states
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.api.deps import email_verified_user_permission
+from app.celery.transcription_tasks import job_key, transcribe_audio_job
+from app.core.config import settings
+from app.db.redis import get_redis
 from app.db.session import get_db
-from app.db.schemas import UserDB
-from app.utils.aws_clients import get_s3_client, get_sagemaker_runtime
-from app.utils.stt_helpers import ALLOWED_CONTENT_TYPES, invoke_stt_endpoint, generate_unique_key, hash_unique_key, save_transcription_to_s3
+from app.db.schemas import UploadReference, UploadRequest, UserDB
+from app.utils.admission import admission_controller
+from app.utils.archiver import pair_archiver
+from app.utils.auth_cache import get_api_key_principal, invalidate_api_key
+from app.utils.aws_clients import get_s3_client
+from app.utils.audio_normalization import normalize_audio
+from app.utils.audio_probe import probe_audio
+from app.utils.deadline import current_deadline, deadline_exceeded, request_deadline, request_timeout, run_request
+from app.utils.inference_router import inference_router
+from app.utils.long_audio import invoke_stt_long_audio
+from app.utils.metrics import AUDIO_SECONDS_PROCESSED, TRANSCRIBE_STAGE_SECONDS, VAD_AUDIO_SECONDS, record_upload_stage, time_stage
+from app.utils.rate_limiter import rate_limiter
+from app.utils.resilience import is_retryable
+from app.utils.result_cache import audio_cache_key, content_cache_key, result_cache
+from app.utils.streaming_body import open_upload_buffer
+from app.utils.streaming_transcription import StreamingTranscriber
+from app.utils.usage_accumulator import usage_accumulator
+from app.utils.vad import apply_vad
+from app.utils.stt_helpers import ALLOWED_CONTENT_TYPES, ARCHIVE_CONTENT_TYPES, open_audio_archive, get_file_extension, read_s3_object, upload_key, get_job_status, invoke_stt_clip, generate_unique_key, hash_unique_key
 
 router = APIRouter()
 
+async def authenticate_api_key(api_key: str, db: AsyncIOMotorDatabase):
+    """Resolve the x-api-key header to a principal that can afford a transcription.
+
+    Also charges the request against the key's and user's rate limits.
+    """
+    hashed_api_key = await hash_unique_key(api_key)
+    principal = await get_api_key_principal(hashed_api_key, db)
+    
+    if not principal:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    # Include debits this worker has not flushed yet so they cannot be overspent
+    if principal.balance - usage_accumulator.pending_cost(principal.email) <= 0:
+        raise HTTPException(status_code=400, detail="Insufficient balance. Please refill.")
+
+    await rate_limiter.check(hashed_api_key, principal)
+    
+    return principal
+
+async def probe_upload(audio, content_type: str):
+    """Read the duration from the container headers, or None when they are unreadable and that is allowed.
+
+    The probe runs in a thread so a large or crafted file cannot stall the event loop.
+    """
+    if len(audio) > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Audio exceeds {settings.UPLOAD_MAX_BYTES} bytes.")
+    try:
+        return await asyncio.to_thread(probe_audio, audio, content_type)
+    except ValueError as e:
+        if settings.AUDIO_PROBE_REJECT_UNREADABLE:
+            raise HTTPException(status_code=400, detail=f"Unreadable audio: {str(e)}")
+        return None
+
+def check_affordable(probe, principal, committed_seconds: float = 0.0):
+    """Reject audio that is too long or unaffordable for the probed duration.
+
+    committed_seconds is audio already accepted for the same request but not
+    yet recorded as usage.
+    """
+    if probe is None:
+        return
+    if probe.duration > settings.AUDIO_MAX_DURATION_SECONDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Audio is about {probe.duration:.0f}s long, the limit is {settings.AUDIO_MAX_DURATION_SECONDS:.0f}s."
+        )
+    remaining = principal.balance - usage_accumulator.pending_cost(principal.email) - committed_seconds * usage_accumulator.price_per_second
+    estimated_cost = probe.duration * usage_accumulator.price_per_second
+    if estimated_cost > remaining:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient balance: about {probe.duration:.0f}s of audio costs {estimated_cost:.4f}, {max(remaining, 0):.4f} left. Please refill."
+        )
+
+async def check_audio_preflight(audio, content_type: str, principal):
+    """Reject audio that is too large, too long or unaffordable before any inference is spent on it."""
+    probe = await probe_upload(audio, content_type)
+    check_affordable(probe, principal)
+    return probe
+
+
 @router.post("/generate-api-key")
 async def generate_api_key(
     current_user: UserDB = Depends(email_verified_user_permission),
@@ -21,56 +109,580 @@ async def generate_api_key(
     hashed_api_key = await hash_unique_key(api_key)
 
     # Store the hashed API key in the database for the user
-    await db["users"].update_one(
+    previous_user = await db["users"].find_one_and_update(
         {"email": current_user.email},
-        {"$set": {"api_key": hashed_api_key}}
+        {"$set": {"api_key": hashed_api_key}},
+        projection={"api_key": 1}
     )
 
+    # Make sure the rotated key stops working in every worker
+    if previous_user and previous_user.get("api_key"):
+        await invalidate_api_key(previous_user["api_key"])
+
     return {"api_key": api_key}
 
+def vad_requested(principal, vad_header) -> bool:
+    """The x-vad header wins when sent, otherwise the user's vad_enabled setting."""
+    if vad_header:
+        return vad_header.lower() == "true"
+    return principal.vad_enabled
+
+async def transcribe_buffer(upload, filename: str, content_type: str, email: str, long_audio: bool, model: str, vad: bool = False):
+    """Normalize, optionally trim silence, transcribe and archive one upload that is already in memory."""
+    # Downmix and resample to what the endpoint expects, if configured for it
+    with time_stage("normalize"):
+        audio, normalized_filename, normalized_content_type = await normalize_audio(
+            upload, filename, content_type, model
+        )
+    vad_report = None
+    if vad:
+        with time_stage("vad"):
+            audio, normalized_filename, normalized_content_type, vad_report = await apply_vad(
+                audio, normalized_filename, normalized_content_type
+            )
+        if vad_report:
+            VAD_AUDIO_SECONDS.labels(outcome="kept").inc(vad_report["kept_seconds"])
+            VAD_AUDIO_SECONDS.labels(outcome="removed").inc(vad_report["removed_seconds"])
+            vad_report["cost_saved"] = round(vad_report["removed_seconds"] * settings.PRICE_PER_SECOND, 6)
+
+    if vad_report and vad_report["kept_seconds"] == 0:
+        # Nothing but silence, there is nothing to send to the endpoint
+        result = {"prediction": "", "duration": 0}
+    elif long_audio:
+        # Opt-in: split long recordings into overlapping windows transcribed concurrently
+        result = await invoke_stt_long_audio(audio, normalized_filename, normalized_content_type, model)
+    else:
+        result = await invoke_stt_clip(audio, normalized_filename, normalized_content_type, model)
+    if vad_report:
+        result = {**result, "vad": vad_report}
+    # Hand the original audio and transcript to the background archiver
+    with time_stage("archive"):
+        pair_archiver.submit(
+            upload,
+            ALLOWED_CONTENT_TYPES[content_type],
+            content_type,
+            email,
+            result.get("prediction", "").strip()
+        )
+    return result
+
+def transcription_error(e: Exception) -> HTTPException:
+    if is_retryable(e):
+        # Throttling or endpoint errors that outlasted the retries are the client's to retry later
+        return HTTPException(
+            status_code=503,
+            detail=f"Transcription service unavailable: {str(e)}",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+        )
+    return HTTPException(status_code=500, detail=f"Transcription service failed: {str(e)}")
+
+
 @router.post("/transcribe")
 async def transcribe_audio(
+    request: Request,
     file: UploadFile = File(...),
     api_key: str = Header(None, alias="x-api-key"),
-    db: AsyncIOMotorDatabase = Depends(get_db),
-    sagemaker_runtime=Depends(get_sagemaker_runtime),
-    s3_client=Depends(get_s3_client)
+    long_audio: bool = Header(False, alias="x-long-audio"),
+    cache_mode: str = Header("", alias="x-stt-cache"),
+    vad_header: str = Header(None, alias="x-vad"),
+    model: str = Header(None, alias="x-stt-model"),
+    timeout: float = Header(None, alias="x-request-timeout"),
+    db: AsyncIOMotorDatabase = Depends(get_db)
 ):
+    # The multipart upload has been received and spooled by the time the handler runs
+    record_upload_stage(request)
+    deadline = request_deadline(request, request_timeout(timeout))
+
     # Check file content type
     if file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="Unsupported file format. Only mp3, wav, and webm are allowed.")
+    model = inference_router.resolve(model)
     
     # Verify API key and get user
-    hashed_api_key = await hash_unique_key(api_key)
-    user_in_db = await db["users"].find_one({"api_key": hashed_api_key})
-    
-    if not user_in_db:
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    
-    if user_in_db["balance"] <= 0:
-        raise HTTPException(status_code=400, detail="Insufficient balance. Please refill.")
+    with time_stage("auth"):
+        principal = await authenticate_api_key(api_key, db)
+
+    with time_stage("probe"), open_upload_buffer(file.file) as upload:
+        await check_audio_preflight(upload, file.content_type, principal)
+    vad = vad_requested(principal, vad_header)
     
-    # Pass the file to the SageMaker endpoint and handle any exceptions
+    async def transcribe():
+        # Bound in-flight transcriptions per worker, shedding with 503 when saturated
+        admission_started = time.perf_counter()
+        async with admission_controller.slot():
+            TRANSCRIBE_STAGE_SECONDS.labels(stage="admission_wait").observe(time.perf_counter() - admission_started)
+            # Reference the spooled upload in place instead of copying it into a new buffer
+            with open_upload_buffer(file.file) as upload:
+                return await transcribe_buffer(
+                    upload, file.filename, file.content_type, principal.email, long_audio, model, vad
+                )
+
+    async def transcribe_cached():
+        if cache_mode.lower() == "bypass":
+            return await transcribe()
+        # Identical audio for the same model and mode reuses a stored or in-flight result
+        mode = ("long" if long_audio else "single") + (":vad" if vad else "")
+        with time_stage("cache_key"):
+            cache_key = await audio_cache_key(file, model, mode)
+        return await result_cache.get_or_invoke(cache_key, transcribe)
+
+    # Pass the file to the SageMaker endpoint and handle any exceptions; a client
+    # that disconnects or a passed deadline cancels the work before anything is billed
     try:
-        transcription_result = await invoke_stt_endpoint(file, sagemaker_runtime)
+        transcription_result = await run_request(request, deadline, transcribe_cached)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Transcription service failed: {str(e)}")
+        raise transcription_error(e)
     
-    # Update user's transcription duration and balance in the database
+    # Queue the transcription duration and balance debit for the next batched write
     transcription_duration_seconds = transcription_result.get("duration", 1)
-    await db["users"].update_one(
-        {"email": user_in_db["email"]},
-        {
-            "$inc": {
-                "total_transcription_duration_seconds": transcription_duration_seconds,
-                "balance": -transcription_duration_seconds * 0.001
-            }
+    with time_stage("billing"):
+        usage_accumulator.record(principal.email, transcription_duration_seconds)
+        await rate_limiter.debit_audio(principal, transcription_duration_seconds)
+    AUDIO_SECONDS_PROCESSED.labels(source="transcribe").inc(transcription_duration_seconds)
+
+    transcription_result_text = transcription_result.get("prediction", "").strip()
+
+    if "vad" in transcription_result:
+        return {"transcription": transcription_result_text, "vad": transcription_result["vad"]}
+    return {"transcription": transcription_result_text}
+
+@router.post("/transcribe/batch")
+async def transcribe_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    api_key: str = Header(None, alias="x-api-key"),
+    long_audio: bool = Header(False, alias="x-long-audio"),
+    cache_mode: str = Header("", alias="x-stt-cache"),
+    vad_header: str = Header(None, alias="x-vad"),
+    model: str = Header(None, alias="x-stt-model"),
+    timeout: float = Header(None, alias="x-request-timeout"),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Transcribe many files under one API key check, streaming an NDJSON line per file as it finishes.
+
+    Files are sent as repeated multipart parts, zip archives of audio files, or
+    both. The batch is billed with one aggregated debit when the stream ends.
+    Files still unfinished at the deadline get a 504 line, and those in flight
+    when the client disconnects are cancelled unbilled.
+    """
+    record_upload_stage(request)
+    deadline = request_deadline(request, request_timeout(timeout))
+
+    for file in files:
+        if file.content_type not in ALLOWED_CONTENT_TYPES and file.content_type not in ARCHIVE_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail="Unsupported file format. Only mp3, wav, webm and zip archives of them are allowed.")
+    model = inference_router.resolve(model)
+
+    with time_stage("auth"):
+        principal = await authenticate_api_key(api_key, db)
+
+    # Read the uploads now, they are closed once the handler returns and streaming starts;
+    # archives are kept compressed and each member is decompressed when it is transcribed
+    items = []
+    for file in files:
+        if file.content_type in ARCHIVE_CONTENT_TYPES:
+            items.extend(await asyncio.to_thread(
+                open_audio_archive, await file.read(), settings.BATCH_MAX_FILES - len(items), settings.BATCH_MAX_ARCHIVE_BYTES
+            ))
+        else:
+            items.append((file.filename, file.content_type, await file.read()))
+        if len(items) > settings.BATCH_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"Batch exceeds {settings.BATCH_MAX_FILES} files.")
+
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    vad = vad_requested(principal, vad_header)
+    mode = ("long" if long_audio else "single") + (":vad" if vad else "")
+    transcribed_seconds = 0.0
+    reserved_seconds = 0.0
+
+    async def transcribe_item(index: int, filename: str, content_type: str, audio) -> dict:
+        nonlocal transcribed_seconds, reserved_seconds
+        async def transcribe():
+            admission_started = time.perf_counter()
+            async with admission_controller.slot():
+                TRANSCRIBE_STAGE_SECONDS.labels(stage="admission_wait").observe(time.perf_counter() - admission_started)
+                return await transcribe_buffer(audio, filename, content_type, principal.email, long_audio, model, vad)
+
+        async with semaphore:
+            reserved = 0.0
+            try:
+                if callable(audio):
+                    # Archive members are only decompressed once their turn comes
+                    audio = await asyncio.to_thread(audio)
+                probe = await probe_upload(audio, content_type)
+                # Files still in flight hold their estimated duration against the balance
+                check_affordable(probe, principal, transcribed_seconds + reserved_seconds)
+                reserved = probe.duration if probe else 0.0
+                reserved_seconds += reserved
+                async with asyncio.timeout(deadline.remaining()):
+                    if cache_mode.lower() == "bypass":
+                        result = await transcribe()
+                    else:
+                        cache_key = await content_cache_key(audio, model, mode)
+                        result = await result_cache.get_or_invoke(cache_key, transcribe)
+            except Exception as e:
+                if isinstance(e, HTTPException):
+                    error = e
+                elif deadline.expired:
+                    error = deadline_exceeded(deadline)
+                else:
+                    error = transcription_error(e)
+                return {"index": index, "filename": filename, "error": error.detail, "status_code": error.status_code}
+            finally:
+                reserved_seconds -= reserved
+
+        duration = result.get("duration", 1)
+        # Counted as soon as the work is done, so it is billed even if the client stops reading
+        transcribed_seconds += duration
+        line = {
+            "index": index,
+            "filename": filename,
+            "transcription": result.get("prediction", "").strip(),
+            "duration": duration,
         }
+        if "vad" in result:
+            line["vad"] = result["vad"]
+        return line
+
+    async def stream_results():
+        # The stream runs in its own task, so the items are given the deadline explicitly
+        current_deadline.set(deadline)
+        tasks = [asyncio.create_task(transcribe_item(index, *item)) for index, item in enumerate(items)]
+        succeeded = 0
+        finished = False
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                succeeded += "error" not in line
+                yield json.dumps(line) + "\n"
+            summary = {
+                "files": len(items),
+                "succeeded": succeeded,
+                "failed": len(items) - succeeded,
+                "duration": transcribed_seconds,
+                "cost": transcribed_seconds * usage_accumulator.price_per_second,
+            }
+            yield json.dumps({"summary": summary}) + "\n"
+            finished = True
+        finally:
+            if not finished:
+                # The client went away; in-flight files are cancelled and only finished ones are billed
+                deadline.cancel_reason = "disconnect"
+            for task in tasks:
+                task.cancel()
+            # One aggregated debit for the whole batch
+            if transcribed_seconds:
+                AUDIO_SECONDS_PROCESSED.labels(source="batch").inc(transcribed_seconds)
+                with time_stage("billing"):
+                    usage_accumulator.record(principal.email, transcribed_seconds)
+                    # After a disconnect this runs in a cancelled task, so the debit must outlive it
+                    await asyncio.shield(rate_limiter.debit_audio(principal, transcribed_seconds))
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@router.post("/uploads")
+async def create_upload(
+    upload: UploadRequest,
+    api_key: str = Header(None, alias="x-api-key"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    s3_client=Depends(get_s3_client),
+    redis=Depends(get_redis)
+):
+    """Presign a direct upload to S3, so the audio never passes through the API workers.
+
+    The returned upload_id is then passed to /transcribe/reference or /jobs/reference.
+    """
+    if upload.content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported file format. Only mp3, wav, and webm are allowed.")
+
+    principal = await authenticate_api_key(api_key, db)
+
+    upload_id = str(uuid.uuid4())
+    bucket_name = settings.STT_S3_PAIRS_BUCKET_NAME
+    audio_file_key = f"uploads/{upload_id}.{ALLOWED_CONTENT_TYPES[upload.content_type]}"
+    expires_in = settings.UPLOAD_URL_EXPIRES_SECONDS
+    if upload.method == "put":
+        url = await s3_client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": bucket_name, "Key": audio_file_key, "ContentType": upload.content_type},
+            ExpiresIn=expires_in
+        )
+        presigned = {"method": "PUT", "url": url, "headers": {"Content-Type": upload.content_type}}
+    else:
+        post = await s3_client.generate_presigned_post(
+            bucket_name,
+            audio_file_key,
+            Fields={"Content-Type": upload.content_type},
+            Conditions=[{"Content-Type": upload.content_type}, ["content-length-range", 1, settings.UPLOAD_MAX_BYTES]],
+            ExpiresIn=expires_in
+        )
+        presigned = {"method": "POST", "url": post["url"], "fields": post["fields"]}
+
+    await redis.set(
+        upload_key(upload_id),
+        json.dumps({
+            "email": principal.email,
+            "key": audio_file_key,
+            "content_type": upload.content_type,
+            "filename": upload.filename or audio_file_key.rsplit("/", 1)[1],
+        }),
+        ex=expires_in + settings.JOB_RESULT_TTL_SECONDS
     )
 
-    transcription_result_text = transcription_result.get("prediction", "").strip()
+    return {"upload_id": upload_id, "expires_in": expires_in, **presigned}
+
+async def get_uploaded_object(upload_id: str, principal, redis, s3_client):
+    """Look up a finished presigned upload owned by the principal, with its head_object metadata."""
+    stored = await redis.get(upload_key(upload_id))
+    upload = json.loads(stored) if stored else None
+    if not upload or upload["email"] != principal.email:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    try:
+        head = await s3_client.head_object(Bucket=settings.STT_S3_PAIRS_BUCKET_NAME, Key=upload["key"])
+    except ClientError as e:
+        if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 404:
+            raise HTTPException(status_code=409, detail="Upload has not been completed")
+        raise
+
+    # A presigned PUT cannot enforce these, so check what actually arrived
+    if not 0 < head["ContentLength"] <= settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded file is empty or too large")
+    if head.get("ContentType", upload["content_type"]) != upload["content_type"]:
+        raise HTTPException(status_code=400, detail="Uploaded content type does not match the upload request")
+    return upload, head
+
+@router.post("/transcribe/reference")
+async def transcribe_reference(
+    request: Request,
+    reference: UploadReference,
+    api_key: str = Header(None, alias="x-api-key"),
+    long_audio: bool = Header(False, alias="x-long-audio"),
+    cache_mode: str = Header("", alias="x-stt-cache"),
+    vad_header: str = Header(None, alias="x-vad"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    model: str = Header(None, alias="x-stt-model"),
+    timeout: float = Header(None, alias="x-request-timeout"),
+    s3_client=Depends(get_s3_client),
+    redis=Depends(get_redis)
+):
+    """Transcribe audio uploaded to S3 through /uploads, reading it from S3 in concurrent ranges.
+
+    A cancelled or timed-out request leaves the upload in place to be retried.
+    """
+    deadline = request_deadline(request, request_timeout(timeout))
+    model = inference_router.resolve(model)
+    with time_stage("auth"):
+        principal = await authenticate_api_key(api_key, db)
+    upload, head = await get_uploaded_object(reference.upload_id, principal, redis, s3_client)
+    bucket_name = settings.STT_S3_PAIRS_BUCKET_NAME
+    vad = vad_requested(principal, vad_header)
+
+    async def transcribe():
+        admission_started = time.perf_counter()
+        async with admission_controller.slot():
+            TRANSCRIBE_STAGE_SECONDS.labels(stage="admission_wait").observe(time.perf_counter() - admission_started)
+            with time_stage("download"):
+                audio = await read_s3_object(s3_client, bucket_name, upload["key"], head["ContentLength"], head["ETag"])
+            with time_stage("probe"):
+                await check_audio_preflight(audio, upload["content_type"], principal)
+            return await transcribe_buffer(
+                audio, upload["filename"], upload["content_type"], principal.email, long_audio, model, vad
+            )
+
+    async def transcribe_cached():
+        if cache_mode.lower() == "bypass":
+            return await transcribe()
+        # The ETag identifies the object's content, so a hit skips the download as well
+        mode = ("long" if long_audio else "single") + (":vad" if vad else "")
+        cache_key = ":".join((model, mode, "s3", head["ETag"].strip('"')))
+        return await result_cache.get_or_invoke(cache_key, transcribe)
+
+    try:
+        transcription_result = await run_request(request, deadline, transcribe_cached)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise transcription_error(e)
+
+    transcription_duration_seconds = transcription_result.get("duration", 1)
+    with time_stage("billing"):
+        usage_accumulator.record(principal.email, transcription_duration_seconds)
+        await rate_limiter.debit_audio(principal, transcription_duration_seconds)
+    AUDIO_SECONDS_PROCESSED.labels(source="reference").inc(transcription_duration_seconds)
 
-    # Save transcription and audio to S3
-    # await save_transcription_to_s3(file, transcription_result_text, user_in_db["email"], s3_client)
+    # The upload is consumed, the archiver keeps its own copy of the pair
+    await redis.delete(upload_key(reference.upload_id))
+    await s3_client.delete_object(Bucket=bucket_name, Key=upload["key"])
 
-    return {"transcription": transcription_result_text}
\ No newline at end of file
+    if "vad" in transcription_result:
+        return {"transcription": transcription_result.get("prediction", "").strip(), "vad": transcription_result["vad"]}
+    return {"transcription": transcription_result.get("prediction", "").strip()}
+
+@router.post("/jobs", status_code=202)
+async def submit_transcription_job(
+    file: UploadFile = File(...),
+    api_key: str = Header(None, alias="x-api-key"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    s3_client=Depends(get_s3_client),
+    redis=Depends(get_redis)
+):
+    # Check file content type
+    if file.content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported file format. Only mp3, wav, and webm are allowed.")
+
+    principal = await authenticate_api_key(api_key, db)
+    with open_upload_buffer(file.file) as upload:
+        await check_audio_preflight(upload, file.content_type, principal)
+
+    # Stage the audio in S3 so the broker only carries a reference
+    job_id = str(uuid.uuid4())
+    file_extension = await get_file_extension(file.content_type)
+    bucket_name = settings.STT_S3_PAIRS_BUCKET_NAME
+    audio_file_key = f"jobs/{job_id}.{file_extension}"
+    file.file.seek(0)
+    await s3_client.put_object(
+        Bucket=bucket_name,
+        Key=audio_file_key,
+        Body=file.file,
+        ContentType=file.content_type
+    )
+
+    await redis.set(job_key(job_id, "owner"), principal.email, ex=settings.JOB_RESULT_TTL_SECONDS)
+    transcribe_audio_job.apply_async(
+        args=[bucket_name, audio_file_key, file.filename, file.content_type, principal.email],
+        task_id=job_id
+    )
+
+    return {"job_id": job_id, "status": states.PENDING}
+
+@router.post("/jobs/reference", status_code=202)
+async def submit_reference_job(
+    reference: UploadReference,
+    api_key: str = Header(None, alias="x-api-key"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    s3_client=Depends(get_s3_client),
+    redis=Depends(get_redis)
+):
+    """Queue a job for audio uploaded through /uploads; the API worker never touches its bytes."""
+    principal = await authenticate_api_key(api_key, db)
+    upload, _ = await get_uploaded_object(reference.upload_id, principal, redis, s3_client)
+    await redis.delete(upload_key(reference.upload_id))
+
+    job_id = str(uuid.uuid4())
+    await redis.set(job_key(job_id, "owner"), principal.email, ex=settings.JOB_RESULT_TTL_SECONDS)
+    transcribe_audio_job.apply_async(
+        args=[settings.STT_S3_PAIRS_BUCKET_NAME, upload["key"], upload["filename"], upload["content_type"], principal.email],
+        task_id=job_id
+    )
+
+    return {"job_id": job_id, "status": states.PENDING}
+
+@router.get("/jobs/{job_id}")
+async def get_transcription_job(
+    job_id: str,
+    wait: float = 0,
+    api_key: str = Header(None, alias="x-api-key"),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    redis=Depends(get_redis)
+):
+    hashed_api_key = await hash_unique_key(api_key)
+    principal = await get_api_key_principal(hashed_api_key, db)
+    if not principal:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+    if await redis.get(job_key(job_id, "owner")) != principal.email:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # Long-poll until the job finishes or the wait budget runs out
+    deadline = time.monotonic() + min(max(wait, 0), settings.JOB_MAX_WAIT_SECONDS)
+    while True:
+        job = await get_job_status(job_id)
+        if job["status"] in states.READY_STATES or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(0.5)
+
+
+async def receive_stream_api_key(websocket: WebSocket):
+    """The key from a first {"event": "auth", "api_key": ...} message, or None if the first message is anything else."""
+    try:
+        message = await asyncio.wait_for(websocket.receive(), settings.STREAM_AUTH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return None
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    try:
+        event = json.loads(message.get("text") or "")
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(event, dict) or event.get("event") != "auth" or not isinstance(event.get("api_key"), str):
+        return None
+    return event["api_key"]
+
+@router.websocket("/stream")
+async def stream_transcription(
+    websocket: WebSocket,
+    sample_rate: int = 16000,
+    model: str = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    api_key = websocket.headers.get("x-api-key")
+    model = websocket.headers.get("x-stt-model") or model
+    try:
+        model = inference_router.resolve(model)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    if sample_rate not in settings.STREAM_SAMPLE_RATES:
+        await websocket.close(code=1008, reason=f"sample_rate must be one of {settings.STREAM_SAMPLE_RATES}")
+        return
+    accepted = False
+    if not api_key:
+        # Browsers cannot set headers on a WebSocket, so they send the key in a first message;
+        # never in the URL, which ends up in access logs
+        await websocket.accept()
+        accepted = True
+        try:
+            api_key = await receive_stream_api_key(websocket)
+        except WebSocketDisconnect:
+            return
+    principal = await get_api_key_principal(await hash_unique_key(api_key), db) if api_key else None
+    if not principal or principal.balance - usage_accumulator.pending_cost(principal.email) <= 0:
+        await websocket.close(code=1008)
+        return
+    try:
+        await rate_limiter.check(await hash_unique_key(api_key), principal)
+    except HTTPException:
+        await websocket.close(code=1013)  # Try again later
+        return
+
+    if not accepted:
+        await websocket.accept()
+    transcriber = StreamingTranscriber(websocket, principal, model, sample_rate)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                # Binary frames carry 16-bit little-endian mono PCM at sample_rate
+                await transcriber.feed(message["bytes"])
+            elif message.get("text"):
+                try:
+                    event = json.loads(message["text"])
+                except json.JSONDecodeError:
+                    event = None
+                if not isinstance(event, dict):
+                    await websocket.close(code=1003, reason="Text frames must be JSON objects")
+                    break
+                if event.get("event") == "end":
+                    await transcriber.finish()
+                    await websocket.close()
+                    break
+    except (WebSocketDisconnect, RuntimeError):
+        # The client left, or the transcriber closed the socket on an exhausted balance
+        pass
+    finally:
+        await transcriber.close()
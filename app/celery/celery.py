@@ -11,7 +11,7 @@ celery_app = Celery(
     "worker",
     broker=redis_endpoint,
     backend=redis_endpoint,
-    include=["app.celery.tasks"]
+    include=["app.celery.tasks", "app.celery.transcription_tasks"]
 )
 
 # Determine if SSL should be required based on the environment
@@ -28,5 +28,13 @@ celery_app.conf.update(
     redis_backend_use_ssl=backend_ssl_config
 )
 
+# Transcription jobs run on their own queue so they never delay OTP emails
+celery_app.conf.update(
+    task_routes={"stt.transcribe_audio_job": {"queue": settings.TRANSCRIPTION_QUEUE}},
+    result_expires=settings.JOB_RESULT_TTL_SECONDS,
+    task_track_started=True,
+    worker_prefetch_multiplier=1  # Long jobs with acks_late should not be hoarded by one process
+)
+
 if __name__ == '__main__':
     celery_app.start()
\ No newline at end of file
@@ -1,80 +1,93 @@
+import json
+import smtplib
 from .celery import celery_app
-from app.utils.smtp_client import SMTPClient
+from app.utils.smtp_client import MessageTemplate, SMTPConnectionPool
 from app.core.config import settings
 
-@celery_app.task
-def send_email_confirmation_otp_email(email, otp):
-    smtp_client = SMTPClient(
-        smtp_server=settings.SMTP_SERVER,
-        smtp_port=settings.SMTP_PORT,
-        username=settings.SMTP_USERNAME,
-        password=settings.SMTP_PASSWORD,
-        mail_from='noreply@fastbank.am'
-    )
-    html_body = f"""
+MAIL_FROM = 'noreply@fastbank.am'
+OTP_OUTBOX_KEY = "stt:email:otp-outbox"
+OTP_FLUSH_SCHEDULED_KEY = "stt:email:otp-flush-scheduled"
+
+# One pool per worker process; sessions survive between tasks
+smtp_pool = SMTPConnectionPool(
+    smtp_server=settings.SMTP_SERVER,
+    smtp_port=settings.SMTP_PORT,
+    username=settings.SMTP_USERNAME,
+    password=settings.SMTP_PASSWORD,
+    use_tls=settings.SMTP_STARTTLS,
+    max_size=settings.SMTP_POOL_MAX_SIZE,
+    idle_timeout=settings.SMTP_IDLE_TIMEOUT_SECONDS,
+    keepalive_interval=settings.SMTP_KEEPALIVE_SECONDS,
+)
+
+# Rendered once at import, only the recipient and OTP change per message
+OTP_TEMPLATES = {
+    "email_confirmation": MessageTemplate(
+        MAIL_FROM,
+        subject="Your FastBank - Speech To Text OTP",
+        body="Your OTP is $otp",
+        html_body="""
     <html>
       <body>
         <h2>Welcome to FastBank - Speech To Text</h2>
-        <p>Your OTP is: <strong>{otp}</strong></p>
+        <p>Your OTP is: <strong>$otp</strong></p>
         <p>This OTP will expire in 5 minutes.</p>
       </body>
     </html>
-    """
-    smtp_client.send_email(
+    """,
+    ),
+    "password_reset": MessageTemplate(
+        MAIL_FROM,
         subject="Your FastBank - Speech To Text OTP",
-        body=f"Your OTP is {otp}",
-        recipients=[email],
-        html_body=html_body
-    )
-
-@celery_app.task
-def send_password_reset_otp_email(email, otp):
-    smtp_client = SMTPClient(
-        smtp_server=settings.SMTP_SERVER,
-        smtp_port=settings.SMTP_PORT,
-        username=settings.SMTP_USERNAME,
-        password=settings.SMTP_PASSWORD,
-        mail_from='noreply@fastbank.am'
-    )
-    html_body = f"""
+        body="Your OTP is $otp",
+        html_body="""
     <html>
       <body>
         <h2>Your FastBank - Speech To Text Password Reset OTP</h2>
-        <p>Your OTP is: <strong>{otp}</strong></p>
+        <p>Your OTP is: <strong>$otp</strong></p>
         <p>This OTP will expire in 5 minutes.</p>
         <p>Thank you for registering!</p>
       </body>
     </html>
-    """
-    smtp_client.send_email(
-        subject="Your FastBank - Speech To Text OTP",
-        body=f"Your OTP is {otp}",
-        recipients=[email],
-        html_body=html_body
-    )
+    """,
+    ),
+}
+
+def send_otp_email(kind, email, otp):
+    smtp_pool.send(MAIL_FROM, [email], OTP_TEMPLATES[kind].render([email], otp=otp))
+
+@celery_app.task
+def send_email_confirmation_otp_email(email, otp):
+    send_otp_email("email_confirmation", email, otp)
 
 @celery_app.task
 def send_password_reset_otp_email(email, otp):
-    smtp_client = SMTPClient(
-        smtp_server=settings.SMTP_SERVER,
-        smtp_port=settings.SMTP_PORT,
-        username=settings.SMTP_USERNAME,
-        password=settings.SMTP_PASSWORD,
-        mail_from='noreply@fastbank.am'
-    )
-    html_body = f"""
-    <html>
-      <body>
-        <h2>Your FastBank - Speech To Text Password Reset OTP</h2>
-        <p>Your OTP is: <strong>{otp}</strong></p>
-        <p>This OTP will expire in 5 minutes.</p>
-        <p>Thank you for registering!</p>
-      </body>
-    </html>
-    """
-    smtp_client.send_email(
-        subject="Your FastBank - Speech To Text OTP",
-        body=f"Your OTP is {otp}",
-        recipients=[email],
-        html_body=html_body
-    )
+    send_otp_email("password_reset", email, otp)
+
+@celery_app.task(bind=True, max_retries=3, default_retry_delay=5)
+def flush_otp_email_outbox(self):
+    """Send every OTP email queued in the Redis outbox, several per SMTP session."""
+    redis = celery_app.backend.client
+    # Let the next enqueue schedule another flush while this one drains
+    redis.delete(OTP_FLUSH_SCHEDULED_KEY)
+    while True:
+        batch = redis.lpop(OTP_OUTBOX_KEY, settings.SMTP_BATCH_MAX_SIZE)
+        if not batch:
+            return
+        messages = [json.loads(item) for item in batch]
+        try:
+            with smtp_pool.session() as connection:
+                while messages:
+                    kind, email, otp = messages[0]
+                    try:
+                        connection.sendmail(MAIL_FROM, [email], OTP_TEMPLATES[kind].render([email], otp=otp))
+                        smtp_pool.sent += 1
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # A bad address must not hold up the rest of the batch
+                        print(f"OTP email to {email} refused: {e}")
+                    messages.pop(0)
+        except (smtplib.SMTPException, OSError) as e:
+            # Put back what was not sent and try again with a fresh session
+            if messages:
+                redis.lpush(OTP_OUTBOX_KEY, *[json.dumps(message) for message in reversed(messages)])
+            raise self.retry(exc=e)
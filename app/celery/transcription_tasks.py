@@ -0,0 +1,113 @@
+import json
+import time
+import boto3
+from pymongo import MongoClient
+from .celery import celery_app
+from app.core.config import settings
+from app.utils.aws_clients import region
+from app.utils.streaming_body import MultipartBody
+
+# Created lazily so each prefork child process opens its own connections
+_clients = {}
+
+def _get_client(name: str):
+    if name not in _clients:
+        if name == "users":
+            _clients[name] = MongoClient(settings.MONGODB_URL, maxPoolSize=5).stt_fastbank["users"]
+        else:
+            _clients[name] = boto3.client(name, region_name=region)
+    return _clients[name]
+
+def job_key(job_id: str, suffix: str) -> str:
+    return f"stt:job:{job_id}:{suffix}"
+
+def _split_s3_uri(uri: str):
+    bucket, _, key = uri.removeprefix("s3://").partition("/")
+    return bucket, key
+
+def _read_s3_if_exists(s3, uri: str):
+    bucket, key = _split_s3_uri(uri)
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except s3.exceptions.NoSuchKey:
+        return None
+
+def _invoke_async_endpoint(bucket: str, key: str, content_type: str) -> dict:
+    """Hand the S3 URI to the async inference endpoint and wait for its output object.
+
+    The endpoint reads the audio itself, so its container must accept the raw
+    audio body rather than the multipart form used for real-time invocations.
+    """
+    s3 = _get_client("s3")
+    response = _get_client("runtime.sagemaker").invoke_endpoint_async(
+        EndpointName=settings.SAGEMAKER_ASYNC_ENDPOINT_NAME,
+        InputLocation=f"s3://{bucket}/{key}",
+        ContentType=content_type
+    )
+    deadline = time.monotonic() + settings.ASYNC_INFERENCE_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        output = _read_s3_if_exists(s3, response["OutputLocation"])
+        if output is not None:
+            output_bucket, output_key = _split_s3_uri(response["OutputLocation"])
+            s3.delete_object(Bucket=output_bucket, Key=output_key)
+            return json.loads(output)
+        failure = _read_s3_if_exists(s3, response["FailureLocation"]) if response.get("FailureLocation") else None
+        if failure is not None:
+            raise RuntimeError(f"Async inference failed: {failure.decode(errors='replace')}")
+        time.sleep(settings.ASYNC_INFERENCE_POLL_SECONDS)
+    raise TimeoutError(f"Async inference did not finish within {settings.ASYNC_INFERENCE_TIMEOUT_SECONDS}s")
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True, name="stt.transcribe_audio_job")
+def transcribe_audio_job(self, bucket: str, key: str, filename: str, content_type: str, email: str):
+    s3 = _get_client("s3")
+    sagemaker_runtime = _get_client("runtime.sagemaker")
+
+    # The staged upload is only needed for this job, remove it whether or not the job succeeds
+    try:
+        if settings.SAGEMAKER_ASYNC_ENDPOINT_NAME:
+            # Only the object's URI is sent, the audio never passes through this worker
+            self.update_state(state="PROGRESS", meta={"stage": "transcribing", "progress": 0.3})
+            transcription_result = _invoke_async_endpoint(bucket, key, content_type)
+        else:
+            self.update_state(state="PROGRESS", meta={"stage": "downloading", "progress": 0.1})
+            audio = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+            self.update_state(state="PROGRESS", meta={"stage": "transcribing", "progress": 0.3})
+            body = MultipartBody(audio, filename, content_type)
+            try:
+                response = sagemaker_runtime.invoke_endpoint(
+                    EndpointName=settings.SAGEMAKER_ENDPOINT_NAME,
+                    ContentType=body.content_type,
+                    Body=body
+                )
+                transcription_result = json.loads(response["Body"].read())
+            finally:
+                body.close()
+    finally:
+        s3.delete_object(Bucket=bucket, Key=key)
+
+    self.update_state(state="PROGRESS", meta={"stage": "billing", "progress": 0.9})
+    transcription_duration_seconds = transcription_result.get("duration")
+    # Bill what the model measured, never a guess
+    if not isinstance(transcription_duration_seconds, (int, float)) or transcription_duration_seconds < 0:
+        raise ValueError(f"Transcription result has no valid duration: {transcription_duration_seconds!r}")
+
+    # acks_late can redeliver a finished job, bill it at most once
+    redis = celery_app.backend.client
+    if redis.set(job_key(self.request.id, "billed"), 1, nx=True, ex=settings.JOB_RESULT_TTL_SECONDS):
+        _get_client("users").update_one(
+            {"email": email},
+            {
+                "$inc": {
+                    "total_transcription_duration_seconds": transcription_duration_seconds,
+                    "balance": -transcription_duration_seconds * settings.PRICE_PER_SECOND
+                }
+            }
+        )
+        # Let the API workers drop their cached balance snapshot
+        redis.publish(settings.CACHE_INVALIDATION_CHANNEL, json.dumps({"kind": "email", "value": email}))
+
+    return {
+        "transcription": transcription_result.get("prediction", "").strip(),
+        "duration": transcription_duration_seconds,
+    }
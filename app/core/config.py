@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -12,12 +13,138 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     STT_S3_PAIRS_BUCKET_NAME: str = os.getenv("STT_S3_PAIRS_BUCKET_NAME")
     SAGEMAKER_ENDPOINT_NAME: str = os.getenv("SAGEMAKER_ENDPOINT_NAME")
+    AWS_REGION: str = os.getenv("AWS_REGION", "eu-north-1")
     STRIPE_SECRET: str = os.getenv("STRIPE_SECRET")
     SMTP_USERNAME: str = os.getenv("SMTP_USERNAME")
     REDIS_URL: str = os.getenv("REDIS_URL")
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD")
     SMTP_SERVER: str = os.getenv("SMTP_SERVER")
     SMTP_PORT: int = int(os.getenv("SMTP_PORT", 587))
+    SMTP_STARTTLS: bool = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    SMTP_POOL_MAX_SIZE: int = int(os.getenv("SMTP_POOL_MAX_SIZE", 2))
+    SMTP_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", 120))
+    SMTP_KEEPALIVE_SECONDS: float = float(os.getenv("SMTP_KEEPALIVE_SECONDS", 30))
+    # Batching queues OTP emails in Redis and sends each window's worth over one session
+    SMTP_BATCHING_ENABLED: bool = os.getenv("SMTP_BATCHING_ENABLED", "false").lower() == "true"
+    SMTP_BATCH_WINDOW_SECONDS: float = float(os.getenv("SMTP_BATCH_WINDOW_SECONDS", 2))
+    SMTP_BATCH_MAX_SIZE: int = int(os.getenv("SMTP_BATCH_MAX_SIZE", 50))
     ENV: str = os.getenv("ENV", "PROD")
+    PRICE_PER_SECOND: float = float(os.getenv("PRICE_PER_SECOND", 0.001))
+    USAGE_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", 2))
+    USAGE_FLUSH_MAX_PENDING_USERS: int = int(os.getenv("USAGE_FLUSH_MAX_PENDING_USERS", 500))
+    TRANSCRIPTION_QUEUE: str = os.getenv("TRANSCRIPTION_QUEUE", "transcription")
+    JOB_RESULT_TTL_SECONDS: int = int(os.getenv("JOB_RESULT_TTL_SECONDS", 86400))
+    JOB_MAX_WAIT_SECONDS: float = float(os.getenv("JOB_MAX_WAIT_SECONDS", 30))
+    LONG_AUDIO_WINDOW_SECONDS: float = float(os.getenv("LONG_AUDIO_WINDOW_SECONDS", 30))
+    LONG_AUDIO_OVERLAP_SECONDS: float = float(os.getenv("LONG_AUDIO_OVERLAP_SECONDS", 2))
+    LONG_AUDIO_MAX_CONCURRENCY: int = int(os.getenv("LONG_AUDIO_MAX_CONCURRENCY", 4))
+    # Inference backends, e.g. [{"type": "sagemaker", "model": "asr-v2", "endpoint_name": "asr-v2", "region": "eu-west-1"},
+    # {"type": "sagemaker", "model": "asr-v2", "endpoint_name": "asr-v3", "weight": 0.05, "canary": true},
+    # {"type": "http", "model": "asr-local", "url": "http://localhost:8080/invocations"}];
+    # empty means SAGEMAKER_ENDPOINT_NAME, under that name, in AWS_REGION
+    INFERENCE_BACKENDS: list = json.loads(os.getenv("INFERENCE_BACKENDS", "[]"))
+    INFERENCE_DEFAULT_MODEL: str = os.getenv("INFERENCE_DEFAULT_MODEL")
+    ROUTER_EWMA_ALPHA: float = float(os.getenv("ROUTER_EWMA_ALPHA", 0.3))
+    ROUTER_EJECT_AFTER_FAILURES: int = int(os.getenv("ROUTER_EJECT_AFTER_FAILURES", 3))
+    ROUTER_EJECT_SECONDS: float = float(os.getenv("ROUTER_EJECT_SECONDS", 10))
+    ROUTER_EJECT_MAX_SECONDS: float = float(os.getenv("ROUTER_EJECT_MAX_SECONDS", 300))
+    INFERENCE_BATCHING_ENABLED: bool = os.getenv("INFERENCE_BATCHING_ENABLED", "false").lower() == "true"
+    INFERENCE_BATCH_WINDOW_MS: float = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", 10))
+    INFERENCE_BATCH_MAX_SIZE: int = int(os.getenv("INFERENCE_BATCH_MAX_SIZE", 8))
+    INFERENCE_BATCH_MAX_BYTES: int = int(os.getenv("INFERENCE_BATCH_MAX_BYTES", 4 * 1024 * 1024))
+    INFERENCE_BATCH_MAX_CLIP_BYTES: int = int(os.getenv("INFERENCE_BATCH_MAX_CLIP_BYTES", 512 * 1024))
+    AWS_MAX_POOL_CONNECTIONS: int = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", 50))
+    AWS_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("AWS_CONNECT_TIMEOUT_SECONDS", 5))
+    AWS_READ_TIMEOUT_SECONDS: float = float(os.getenv("AWS_READ_TIMEOUT_SECONDS", 60))
+    AWS_KEEPALIVE_SECONDS: float = float(os.getenv("AWS_KEEPALIVE_SECONDS", 60))
+    AWS_MAX_ATTEMPTS: int = int(os.getenv("AWS_MAX_ATTEMPTS", 3))
+    AWS_POOL_SATURATION_THRESHOLD: float = float(os.getenv("AWS_POOL_SATURATION_THRESHOLD", 0.9))
+    RESULT_CACHE_MAX_SIZE: int = int(os.getenv("RESULT_CACHE_MAX_SIZE", 5000))
+    RESULT_CACHE_TTL_SECONDS: float = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 86400))
+    RESULT_CACHE_MAX_RESULT_BYTES: int = int(os.getenv("RESULT_CACHE_MAX_RESULT_BYTES", 64 * 1024))
+    RESULT_CACHE_REDIS_ENABLED: bool = os.getenv("RESULT_CACHE_REDIS_ENABLED", "false").lower() == "true"
+    # Per-model audio preprocessing, e.g. {"my-endpoint": {"sample_rate": 16000}}; the default model is named after SAGEMAKER_ENDPOINT_NAME
+    AUDIO_NORMALIZATION: dict = json.loads(os.getenv("AUDIO_NORMALIZATION", "{}"))
+    STREAM_PARTIAL_INTERVAL_SECONDS: float = float(os.getenv("STREAM_PARTIAL_INTERVAL_SECONDS", 0.3))
+    # Partials transcribe only the end of the segment, so their cost does not grow with its length
+    STREAM_PARTIAL_WINDOW_SECONDS: float = float(os.getenv("STREAM_PARTIAL_WINDOW_SECONDS", 5))
+    STREAM_SEGMENT_MAX_SECONDS: float = float(os.getenv("STREAM_SEGMENT_MAX_SECONDS", 15))
+    STREAM_MIN_SEGMENT_SECONDS: float = float(os.getenv("STREAM_MIN_SEGMENT_SECONDS", 1))
+    STREAM_SILENCE_SECONDS: float = float(os.getenv("STREAM_SILENCE_SECONDS", 0.6))
+    STREAM_SILENCE_RMS: float = float(os.getenv("STREAM_SILENCE_RMS", 0.01))
+    STREAM_SAMPLE_RATES: list = json.loads(os.getenv("STREAM_SAMPLE_RATES", "[8000, 16000, 22050, 24000, 32000, 44100, 48000]"))
+    # How long a stream opened without an x-api-key header may take to send its auth message
+    STREAM_AUTH_TIMEOUT_SECONDS: float = float(os.getenv("STREAM_AUTH_TIMEOUT_SECONDS", 10))
+    # Finalized segments waiting for transcription before the socket stops being read
+    STREAM_MAX_PENDING_SEGMENTS: int = int(os.getenv("STREAM_MAX_PENDING_SEGMENTS", 4))
+    ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 32))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+    ADMISSION_MAX_QUEUE_WAIT_SECONDS: float = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", 5))
+    ADMISSION_MAX_LOOP_LAG_SECONDS: float = float(os.getenv("ADMISSION_MAX_LOOP_LAG_SECONDS", 0.25))
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 2))
+    AUDIO_MAX_DURATION_SECONDS: float = float(os.getenv("AUDIO_MAX_DURATION_SECONDS", 7200))
+    # Unreadable headers would otherwise skip the balance check entirely
+    AUDIO_PROBE_REJECT_UNREADABLE: bool = os.getenv("AUDIO_PROBE_REJECT_UNREADABLE", "true").lower() == "true"
+    # Silence trimming, enabled per user (vad_enabled) or per request (x-vad)
+    VAD_FRAME_MS: float = float(os.getenv("VAD_FRAME_MS", 30))
+    VAD_ENERGY_MARGIN_DB: float = float(os.getenv("VAD_ENERGY_MARGIN_DB", 12))
+    VAD_MIN_ENERGY_DB: float = float(os.getenv("VAD_MIN_ENERGY_DB", -50))
+    VAD_ZCR_THRESHOLD: float = float(os.getenv("VAD_ZCR_THRESHOLD", 0.25))
+    VAD_PAD_MS: float = float(os.getenv("VAD_PAD_MS", 200))
+    VAD_MIN_SILENCE_MS: float = float(os.getenv("VAD_MIN_SILENCE_MS", 1000))
+    VAD_SAMPLE_RATE: int = int(os.getenv("VAD_SAMPLE_RATE", 16000))
+    UPLOAD_URL_EXPIRES_SECONDS: int = int(os.getenv("UPLOAD_URL_EXPIRES_SECONDS", 900))
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", 200 * 1024 * 1024))
+    S3_RANGE_PART_BYTES: int = int(os.getenv("S3_RANGE_PART_BYTES", 8 * 1024 * 1024))
+    S3_RANGE_CONCURRENCY: int = int(os.getenv("S3_RANGE_CONCURRENCY", 4))
+    # Jobs on uploaded audio hand its S3 URI to this endpoint instead of downloading it, when set
+    SAGEMAKER_ASYNC_ENDPOINT_NAME: str = os.getenv("SAGEMAKER_ASYNC_ENDPOINT_NAME")
+    ASYNC_INFERENCE_POLL_SECONDS: float = float(os.getenv("ASYNC_INFERENCE_POLL_SECONDS", 2))
+    ASYNC_INFERENCE_TIMEOUT_SECONDS: float = float(os.getenv("ASYNC_INFERENCE_TIMEOUT_SECONDS", 900))
+    BATCH_MAX_FILES: int = int(os.getenv("BATCH_MAX_FILES", 500))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+    # Uncompressed size allowed per zip archive in a batch
+    BATCH_MAX_ARCHIVE_BYTES: int = int(os.getenv("BATCH_MAX_ARCHIVE_BYTES", 64 * 1024 * 1024))
+    # Defaults for users without their own rate_limits document
+    RATE_LIMIT_REQUESTS_PER_SECOND: float = float(os.getenv("RATE_LIMIT_REQUESTS_PER_SECOND", 5))
+    RATE_LIMIT_REQUEST_BURST: float = float(os.getenv("RATE_LIMIT_REQUEST_BURST", 20))
+    RATE_LIMIT_AUDIO_SECONDS_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_AUDIO_SECONDS_PER_MINUTE", 1800))
+    RATE_LIMIT_LOCAL_BLOCK_MAX_SIZE: int = int(os.getenv("RATE_LIMIT_LOCAL_BLOCK_MAX_SIZE", 10000))
+    INVOKE_MAX_ATTEMPTS: int = int(os.getenv("INVOKE_MAX_ATTEMPTS", 3))
+    INVOKE_BACKOFF_BASE_SECONDS: float = float(os.getenv("INVOKE_BACKOFF_BASE_SECONDS", 0.2))
+    INVOKE_BACKOFF_CAP_SECONDS: float = float(os.getenv("INVOKE_BACKOFF_CAP_SECONDS", 2))
+    INVOKE_HEDGING_ENABLED: bool = os.getenv("INVOKE_HEDGING_ENABLED", "false").lower() == "true"
+    # Transcriptions give up this long after the request arrived, unless x-request-timeout asks for less
+    TRANSCRIBE_DEFAULT_TIMEOUT_SECONDS: float = float(os.getenv("TRANSCRIBE_DEFAULT_TIMEOUT_SECONDS", 300))
+    TRANSCRIBE_MAX_TIMEOUT_SECONDS: float = float(os.getenv("TRANSCRIBE_MAX_TIMEOUT_SECONDS", 900))
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5))
+    CIRCUIT_BREAKER_RESET_SECONDS: float = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", 30))
+    ARCHIVE_ENABLED: bool = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+    ARCHIVE_WORKERS: int = int(os.getenv("ARCHIVE_WORKERS", 2))
+    ARCHIVE_QUEUE_MAX_SIZE: int = int(os.getenv("ARCHIVE_QUEUE_MAX_SIZE", 256))
+    ARCHIVE_QUEUE_MAX_BYTES: int = int(os.getenv("ARCHIVE_QUEUE_MAX_BYTES", 256 * 1024 * 1024))
+    ARCHIVE_MULTIPART_THRESHOLD_BYTES: int = int(os.getenv("ARCHIVE_MULTIPART_THRESHOLD_BYTES", 16 * 1024 * 1024))
+    ARCHIVE_MULTIPART_PART_BYTES: int = int(os.getenv("ARCHIVE_MULTIPART_PART_BYTES", 8 * 1024 * 1024))
+    # Overflowing pairs are written here and uploaded later; empty drops them instead
+    ARCHIVE_SPILL_DIR: str = os.getenv("ARCHIVE_SPILL_DIR", "")
+    ARCHIVE_SHUTDOWN_TIMEOUT_SECONDS: float = float(os.getenv("ARCHIVE_SHUTDOWN_TIMEOUT_SECONDS", 10))
+    CACHE_INVALIDATION_CHANNEL: str = os.getenv("CACHE_INVALIDATION_CHANNEL", "stt:cache-invalidation")
+    API_KEY_CACHE_MAX_SIZE: int = int(os.getenv("API_KEY_CACHE_MAX_SIZE", 10000))
+    API_KEY_CACHE_TTL_SECONDS: float = float(os.getenv("API_KEY_CACHE_TTL_SECONDS", 30))
+    # Argon2id parameters as recommended by RFC 9106; memory cost is in KiB
+    ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", 65536))
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", 3))
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", 4))
+    # Hashing processes for the whole machine, split evenly over the uvicorn workers (at least one each).
+    # Peak hashing memory is about max(PASSWORD_HASH_WORKERS, WEB_CONCURRENCY) x ARGON2_MEMORY_COST,
+    # using ARGON2_PARALLELISM threads per process
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+    # Number of uvicorn worker processes, exported by start_uvicorn.sh
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", 1))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 32))
+    TOKEN_CACHE_MAX_SIZE: int = int(os.getenv("TOKEN_CACHE_MAX_SIZE", 10000))
+    TOKEN_CACHE_MAX_TTL_SECONDS: float = float(os.getenv("TOKEN_CACHE_MAX_TTL_SECONDS", 3600))
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", 30))
 
 settings = Settings()
@@ -0,0 +1,17 @@
+import redis.asyncio as aioredis
+from app.core.config import settings
+
+# Mirror the Celery broker SSL settings: rediss:// certificates are only skipped in development
+connection_kwargs = {}
+if settings.REDIS_URL and settings.REDIS_URL.startswith("rediss://"):
+    connection_kwargs["ssl_cert_reqs"] = "none" if settings.ENV == "DEV" else "required"
+
+redis_client = aioredis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    max_connections=20,  # Per uvicorn worker
+    **connection_kwargs
+)
+
+async def get_redis():
+    yield redis_client
@@ -1,5 +1,5 @@
 from datetime import datetime, UTC
-from typing import Optional, List
+from typing import Literal, Optional, List
 from pydantic import BaseModel, EmailStr, Field, field_validator, ConfigDict
 import re
 
@@ -30,6 +30,23 @@ class UserDB(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+# Slim view of a user resolved from an API key, cached per worker
+class APIKeyPrincipal(BaseModel):
+    email: EmailStr
+    balance: float
+    email_verified: bool = False
+    rate_limits: Optional[dict] = None
+    vad_enabled: bool = False
+
+class UploadRequest(BaseModel):
+    content_type: str
+    filename: Optional[str] = None
+    # A presigned POST can cap the object size, a presigned PUT cannot
+    method: Literal["post", "put"] = "post"
+
+class UploadReference(BaseModel):
+    upload_id: str
+
 class TokenData(BaseModel):
     username: Optional[str] = None
 
@@ -1,8 +1,70 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.v1.endpoints import auth, stt, payments
+from app.core.config import settings
+from app.utils.admission import admission_controller
+from app.utils.archiver import pair_archiver
+from app.utils.auth_cache import api_key_cache, listen_for_invalidations, token_cache, user_cache
+from app.utils.aws_clients import close_aws_clients, open_aws_clients, pool_stats
+from app.utils.batcher import inference_batcher
+from app.utils.inference_router import inference_router
+from app.utils.metrics import PrometheusMiddleware, metrics_response
+from app.utils.password_hashing import password_hasher
+from app.utils.rate_limiter import rate_limiter
+from app.utils.resilience import sagemaker_invoker
+from app.utils.result_cache import result_cache
+from app.utils.usage_accumulator import usage_accumulator
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_aws_clients()
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    usage_flusher = asyncio.create_task(usage_accumulator.run())
+    loop_lag_monitor = asyncio.create_task(admission_controller.monitor_loop_lag())
+    pair_archiver.start()
+    yield
+    loop_lag_monitor.cancel()
+    invalidation_listener.cancel()
+    usage_flusher.cancel()
+    # Write out any debits still buffered in this worker
+    await usage_accumulator.flush()
+    # Finish archiving what this worker accepted before the S3 client goes away
+    await pair_archiver.close(settings.ARCHIVE_SHUTDOWN_TIMEOUT_SECONDS)
+    await inference_router.close()
+    await close_aws_clients()
+    password_hasher.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(PrometheusMiddleware)
 
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(stt.router, prefix="/api/v1/stt", tags=["stt"])
 app.include_router(payments.router, prefix="/api/v1/payments", tags=["payments"])
+
+@app.get("/health", tags=["health"])
+async def health():
+    aws_pools = pool_stats()
+    saturated = any(
+        pool != "unknown" and pool["saturation"] >= settings.AWS_POOL_SATURATION_THRESHOLD for pool in aws_pools.values()
+    )
+    return {
+        "status": "saturated" if saturated else "ok",
+        "aws_pools": aws_pools,
+        "admission": admission_controller.stats(),
+        "api_key_cache": api_key_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "usage_accumulator": usage_accumulator.stats(),
+        "inference_batcher": inference_batcher.stats(),
+        "inference_router": inference_router.stats(),
+        "result_cache": result_cache.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "sagemaker_invoker": sagemaker_invoker.stats(),
+        "archiver": pair_archiver.stats(),
+        "password_hasher": password_hasher.stats(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from app.core.config import settings
+
+class AdmissionController:
+    """Per-worker concurrency limit with a bounded FIFO wait queue for transcriptions.
+
+    Requests beyond max_concurrency wait in a queue of at most max_queue entries.
+    Work is shed with a 503 and Retry-After instead of queueing when the queue is
+    full, when the expected wait exceeds max_queue_wait, or when the event loop
+    is already lagging.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_queue_wait: float, max_loop_lag: float, retry_after: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.max_loop_lag = max_loop_lag
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {}
+        self.loop_lag = 0.0
+        self.service_time = 0.0  # EWMA of how long an admitted request holds its slot
+        self._waiting = deque()
+
+    def _reject(self, reason: str):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        raise HTTPException(
+            status_code=503,
+            detail="Transcription service is overloaded. Please retry later.",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    def estimated_wait(self) -> float:
+        return self.service_time * (len(self._waiting) + 1) / self.max_concurrency
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without queueing; used for best-effort work."""
+        if self.in_flight < self.max_concurrency and not self._waiting and self.loop_lag <= self.max_loop_lag:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        return False
+
+    async def acquire(self):
+        if self.loop_lag > self.max_loop_lag:
+            self._reject("event_loop_lag")
+        if self.try_acquire():
+            return
+        if len(self._waiting) >= self.max_queue:
+            self._reject("queue_full")
+        if self.estimated_wait() > self.max_queue_wait:
+            self._reject("queue_wait")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append(future)
+        try:
+            await asyncio.wait_for(future, self.max_queue_wait)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before we were cancelled
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if future in self._waiting:
+                self._waiting.remove(future)
+        self.admitted += 1
+
+    def release(self):
+        # Hand the slot straight to the next live waiter so it cannot be barged
+        while self._waiting:
+            future = self._waiting.popleft()
+            if not future.done():
+                future.set_result(True)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_time = 0.9 * self.service_time + 0.1 * (time.monotonic() - started)
+            self.release()
+
+    async def monitor_loop_lag(self, interval: float = 0.1):
+        """Measure how late the event loop wakes up; runs for the application's lifetime."""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.monotonic() - started - interval)
+            # Rise immediately, decay gradually so a single spike does not flap
+            self.loop_lag = max(lag, 0.8 * self.loop_lag)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiting),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "loop_lag_seconds": self.loop_lag,
+            "estimated_wait_seconds": self.estimated_wait(),
+        }
+
+admission_controller = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    max_queue_wait=settings.ADMISSION_MAX_QUEUE_WAIT_SECONDS,
+    max_loop_lag=settings.ADMISSION_MAX_LOOP_LAG_SECONDS,
+    retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+)
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.utils.aws_clients import get_s3_client
+from app.utils.streaming_body import buffer_size, retain_buffer
+
+class PairArchiver:
+    """Archives audio/transcript training pairs to S3 off the request path.
+
+    submit() puts the pair on a bounded in-process queue and returns
+    immediately; worker tasks copy the audio out of the upload and send it,
+    using multipart uploads above multipart_threshold bytes. Transcripts are appended to a per-user buffer and
+    written as one JSONL object per user per minute, each line pointing at its
+    audio key. When the queue is full, pairs are spilled to spill_dir and picked
+    up again once the queue has room, or dropped and counted if there is no
+    spill directory.
+    """
+
+    def __init__(self, bucket: str, workers: int, max_queue: int, max_queue_bytes: int, multipart_threshold: int, part_size: int, spill_dir: str):
+        self.bucket = bucket
+        self.workers = workers
+        self.max_queue_bytes = max_queue_bytes
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.spill_dir = spill_dir
+        self.enqueued = 0
+        self.uploaded = 0
+        self.multipart_uploads = 0
+        self.transcript_objects = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._queue_bytes = 0
+        self._transcripts = {}  # (email, minute) -> JSONL lines
+        self._instance = uuid.uuid4().hex[:8]  # Keeps object keys from different workers apart
+        self._tasks = []
+        self._spilling = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.bucket)
+
+    def submit(self, audio, extension: str, content_type: str, user_email: str, transcription: str):
+        """Queue a pair for archival without waiting on S3."""
+        if not self.enabled:
+            return
+        size = buffer_size(audio)
+        item = {
+            "id": str(uuid.uuid4()),
+            "email": user_email,
+            "extension": extension,
+            "content_type": content_type,
+            "transcription": transcription,
+            "created_at": time.time(),
+        }
+        if self._queue.full() or self._queue_bytes + size > self.max_queue_bytes:
+            self._overflow(item, audio)
+            return
+        # The upload buffer is released when the request ends; the worker makes the copy
+        item["audio"] = retain_buffer(audio)
+        self._queue_bytes += size
+        self._queue.put_nowait(item)
+        self.enqueued += 1
+
+    def _overflow(self, item: dict, audio):
+        if not self.spill_dir or len(self._spilling) >= self._queue.maxsize:
+            self.dropped += 1
+            return
+        task = asyncio.create_task(asyncio.to_thread(self._spill, item, retain_buffer(audio)))
+        self._spilling.add(task)
+        task.add_done_callback(self._spilling.discard)
+
+    def _spill(self, item: dict, audio):
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, item["id"])
+            with open(f"{path}.audio", "wb") as f:
+                f.write(audio)
+            # The metadata file is written last and marks the pair as complete
+            with open(f"{path}.json.tmp", "w") as f:
+                json.dump(item, f)
+            os.replace(f"{path}.json.tmp", f"{path}.json")
+            self.spilled += 1
+        except OSError as e:
+            print(f"Failed to spill archive pair: {e}")
+            self.dropped += 1
+
+    def _load_spilled(self, limit: int, max_bytes: int) -> list:
+        items = []
+        try:
+            names = sorted(name for name in os.listdir(self.spill_dir) if name.endswith(".json"))
+        except FileNotFoundError:
+            return items
+        for name in names[:limit]:
+            path = os.path.join(self.spill_dir, name[:-len(".json")])
+            try:
+                size = os.path.getsize(f"{path}.audio")
+                # Stop at the byte budget; a pair larger than all of it can only go in alone
+                if size > max_bytes and (items or self._queue_bytes):
+                    break
+                max_bytes -= size
+                with open(f"{path}.json") as f:
+                    item = json.load(f)
+                with open(f"{path}.audio", "rb") as f:
+                    item["audio"] = f.read()
+                os.remove(f"{path}.json")
+                os.remove(f"{path}.audio")
+            except (OSError, ValueError) as e:
+                print(f"Failed to reload spilled archive pair {name}: {e}")
+                continue
+            items.append(item)
+        return items
+
+    async def _upload_audio(self, s3_client, key: str, audio: bytes, content_type: str):
+        if len(audio) < self.multipart_threshold:
+            await s3_client.put_object(Bucket=self.bucket, Key=key, Body=audio, ContentType=content_type)
+            return
+
+        upload = await s3_client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)
+        try:
+            parts = []
+            for number, start in enumerate(range(0, len(audio), self.part_size), start=1):
+                part = await s3_client.upload_part(
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload["UploadId"],
+                    PartNumber=number,
+                    Body=audio[start:start + self.part_size]
+                )
+                parts.append({"PartNumber": number, "ETag": part["ETag"]})
+            await s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload["UploadId"],
+                MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            await asyncio.shield(s3_client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload["UploadId"]))
+            raise
+        self.multipart_uploads += 1
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            audio = item.pop("audio")
+            size = buffer_size(audio)
+            try:
+                audio = await asyncio.to_thread(bytes, audio)
+                audio_key = f"{item['email']}/{item['id']}.{item['extension']}"
+                await self._upload_audio(await get_s3_client(), audio_key, audio, item["content_type"])
+                self.uploaded += 1
+                # Only pairs whose audio made it to S3 get a transcript line
+                minute = int(item["created_at"] // 60) * 60
+                self._transcripts.setdefault((item["email"], minute), []).append(json.dumps({
+                    "audio_key": audio_key,
+                    "transcription": item["transcription"],
+                    "created_at": item["created_at"],
+                }, ensure_ascii=False))
+            except Exception as e:
+                print(f"Failed to archive audio for {item['email']}: {e}")
+                self.failed += 1
+                if self.spill_dir:
+                    await asyncio.to_thread(self._spill, item, audio)
+            finally:
+                self._queue_bytes -= size
+                self._queue.task_done()
+
+    async def flush_transcripts(self, include_current: bool = False):
+        """Write each finished minute's transcripts as one JSONL object per user."""
+        current_minute = int(time.time() // 60) * 60
+        for email, minute in list(self._transcripts):
+            if minute >= current_minute and not include_current:
+                continue
+            lines = self._transcripts.pop((email, minute))
+            stamp = datetime.fromtimestamp(minute, timezone.utc)
+            key = f"{email}/transcripts/{stamp:%Y-%m-%d}/{stamp:%H-%M}-{self._instance}.jsonl"
+            try:
+                s3_client = await get_s3_client()
+                await s3_client.put_object(
+                    Bucket=self.bucket,
+                    Key=key,
+                    Body="\n".join(lines).encode() + b"\n",
+                    ContentType="application/x-ndjson"
+                )
+                self.transcript_objects += 1
+            except Exception as e:
+                # Retry with the next flush rather than lose the lines
+                print(f"Failed to write transcripts for {email}: {e}")
+                self._transcripts.setdefault((email, minute), []).extend(lines)
+
+    async def _maintain(self, interval: float = 5.0):
+        while True:
+            await asyncio.sleep(interval)
+            # One failed cycle must not stop the flushes and reloads that follow
+            try:
+                await self.flush_transcripts()
+                await self._reload_spilled()
+            except Exception as e:
+                print(f"Archive maintenance failed: {e}")
+
+    async def _reload_spilled(self):
+        """Feed spilled pairs back in while the queue has spare room."""
+        room = self._queue.maxsize - self._queue.qsize()
+        if not self.spill_dir or room <= self._queue.maxsize // 2:
+            return
+        items = await asyncio.to_thread(self._load_spilled, room // 2, self.max_queue_bytes - self._queue_bytes)
+        # submit() may have filled the queue while the pairs were read, so check again per pair
+        leftover = []
+        for item in items:
+            size = len(item["audio"])
+            over_budget = self._queue_bytes and self._queue_bytes + size > self.max_queue_bytes
+            if leftover or self._queue.full() or over_budget:
+                leftover.append(item)
+                continue
+            self._queue_bytes += size
+            self._queue.put_nowait(item)
+        # Their spill files are gone, so write back the pairs that did not fit
+        for item in leftover:
+            await asyncio.to_thread(self._spill, item, item.pop("audio"))
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def close(self, timeout: float):
+        """Drain the queue within timeout, flush all transcripts and stop the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Archive queue not drained on shutdown, {self._queue.qsize()} pairs left")
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._spilling:
+            await asyncio.gather(*self._spilling, return_exceptions=True)
+        # Pairs still queued go to disk when possible
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            audio = item.pop("audio")
+            self._queue_bytes -= buffer_size(audio)
+            if self.spill_dir:
+                await asyncio.to_thread(self._spill, item, audio)
+            else:
+                self.dropped += 1
+        await self.flush_transcripts(include_current=True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self._queue.qsize(),
+            "queue_bytes": self._queue_bytes,
+            "enqueued": self.enqueued,
+            "uploaded": self.uploaded,
+            "multipart_uploads": self.multipart_uploads,
+            "transcript_objects": self.transcript_objects,
+            "pending_transcripts": sum(len(lines) for lines in self._transcripts.values()),
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+pair_archiver = PairArchiver(
+    bucket=settings.STT_S3_PAIRS_BUCKET_NAME if settings.ARCHIVE_ENABLED else None,
+    workers=settings.ARCHIVE_WORKERS,
+    max_queue=settings.ARCHIVE_QUEUE_MAX_SIZE,
+    max_queue_bytes=settings.ARCHIVE_QUEUE_MAX_BYTES,
+    multipart_threshold=settings.ARCHIVE_MULTIPART_THRESHOLD_BYTES,
+    part_size=settings.ARCHIVE_MULTIPART_PART_BYTES,
+    spill_dir=settings.ARCHIVE_SPILL_DIR,
+)
@@ -0,0 +1,64 @@
+import struct
+from dataclasses import dataclass
+
+@dataclass
+class WavInfo:
+    audio_format: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    block_align: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def duration(self) -> float:
+        return self.data_size / (self.block_align * self.sample_rate)
+
+def parse_wav_header(buf) -> WavInfo:
+    """Locate the fmt and data chunks of a RIFF/WAVE buffer without reading the samples.
+
+    Raises ValueError for anything that is not a readable WAV header.
+    """
+    view = memoryview(buf)
+    if len(view) < 12 or bytes(view[0:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size, = struct.unpack_from("<I", view, offset + 4)
+        body_offset = offset + 8
+
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or body_offset + 16 > len(view):
+                raise ValueError("WAV fmt chunk is truncated")
+            fmt = struct.unpack_from("<HHIIHH", view, body_offset)
+            if fmt[0] == 0xFFFE and chunk_size >= 40 and body_offset + 26 <= len(view):
+                # WAVE_FORMAT_EXTENSIBLE keeps the real format tag at the start of the SubFormat GUID
+                fmt = struct.unpack_from("<H", view, body_offset + 24) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk precedes fmt chunk")
+            audio_format, channels, sample_rate, _, block_align, bits_per_sample = fmt
+            if not channels or not sample_rate or not block_align:
+                raise ValueError("WAV fmt chunk has zero channels, sample rate or block align")
+            # Streamed WAVs often leave the size as 0 or 0xFFFFFFFF
+            data_size = min(chunk_size, len(view) - body_offset) or len(view) - body_offset
+            data_size -= data_size % block_align
+            return WavInfo(audio_format, channels, sample_rate, bits_per_sample, block_align, body_offset, data_size)
+
+        offset = body_offset + chunk_size + (chunk_size & 1)
+
+    raise ValueError("WAV file has no data chunk")
+
+def wav_header(data_size: int, channels: int, sample_rate: int, bits_per_sample: int, audio_format: int = 1) -> bytes:
+    """Canonical 44-byte WAV header for a data chunk of the given size."""
+    block_align = channels * bits_per_sample // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, audio_format, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample,
+        b"data", data_size
+    )
@@ -0,0 +1,161 @@
+import asyncio
+import shutil
+from fractions import Fraction
+import numpy as np
+from app.core.config import settings
+from app.utils.audio import parse_wav_header, wav_header
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+# Resampling works on blocks of about this many input samples, plus margins either side
+RESAMPLE_BLOCK_SAMPLES = 1 << 16
+RESAMPLE_MARGIN_SAMPLES = 4096
+RESAMPLE_MAX_DENOMINATOR = 1000
+
+def decode_wav(buf):
+    """Decode a PCM or float WAV buffer into float32 samples shaped (frames, channels)."""
+    info = parse_wav_header(buf)
+    data = np.frombuffer(buf, dtype=np.uint8, count=info.data_size, offset=info.data_offset)
+
+    if info.audio_format == WAVE_FORMAT_IEEE_FLOAT and info.bits_per_sample == 32:
+        samples = data.view("<f4").astype(np.float32)
+    elif info.audio_format != WAVE_FORMAT_PCM:
+        raise ValueError(f"Unsupported WAV format tag {info.audio_format}")
+    elif info.bits_per_sample == 8:
+        samples = (data.astype(np.float32) - 128) / 128
+    elif info.bits_per_sample == 16:
+        samples = data.view("<i2").astype(np.float32) / 32768
+    elif info.bits_per_sample == 24:
+        # Widen each little-endian 3-byte sample into the top of an int32
+        triplets = data.reshape(-1, 3).astype(np.int32)
+        samples = ((triplets[:, 0] << 8) | (triplets[:, 1] << 16) | (triplets[:, 2] << 24)).astype(np.float32) / 2 ** 31
+    elif info.bits_per_sample == 32:
+        samples = data.view("<i4").astype(np.float32) / 2 ** 31
+    else:
+        raise ValueError(f"Unsupported WAV sample width {info.bits_per_sample}")
+
+    return samples.reshape(-1, info.channels), info.sample_rate
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    return samples.mean(axis=1, dtype=np.float32) if samples.shape[1] > 1 else samples[:, 0]
+
+def next_fast_length(n: int) -> int:
+    """Smallest integer of at least n with no prime factors above 5."""
+    best = 1 << max(0, (n - 1).bit_length())
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            candidate = power35
+            while candidate < n:
+                candidate *= 2
+            best = min(best, candidate)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+def _resample_spectrum(samples: np.ndarray, target_length: int) -> np.ndarray:
+    spectrum = np.fft.rfft(samples)
+    # irfft pads or truncates the spectrum to the target length, dropping everything above the new Nyquist
+    return np.fft.irfft(spectrum, target_length) * (target_length / len(samples))
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Band-limited resampling of a mono signal, by truncating or padding the spectrum block by block.
+
+    One FFT over a whole recording costs time and memory that explode for
+    lengths with large prime factors. Blocks are resampled with tapered
+    margins from their neighbours, which are trimmed off again, so cost stays
+    linear in the length whatever it is.
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+
+    target_length = max(1, round(len(samples) * target_rate / source_rate))
+    # Standard rates are exact; unusual ones are approximated by a ratio with a small denominator,
+    # which changes the speed by under 0.1% but keeps every FFT length small and smooth
+    ratio = Fraction(target_rate, source_rate).limit_denominator(RESAMPLE_MAX_DENOMINATOR)
+    up, down = ratio.numerator, ratio.denominator
+    # Whole multiples of down map onto a whole number of output samples, and a
+    # 5-smooth multiple keeps the FFT on its fast path
+    margin = -(-RESAMPLE_MARGIN_SAMPLES // down) * down
+    block = next_fast_length(-(-(RESAMPLE_BLOCK_SAMPLES + 2 * margin) // down)) * down - 2 * margin
+    if len(samples) <= block:
+        return _resample_spectrum(samples, target_length).astype(np.float32)
+
+    block_out, margin_out = block * up // down, margin * up // down
+    blocks = -(-len(samples) // block)
+    padded = np.zeros(blocks * block + 2 * margin, dtype=np.float32)
+    padded[margin:margin + len(samples)] = samples
+    taper = np.ones(block + 2 * margin, dtype=np.float32)
+    ramp = np.hanning(2 * margin)
+    taper[:margin], taper[-margin:] = ramp[:margin], ramp[margin:]
+
+    resampled = np.empty(blocks * block_out, dtype=np.float32)
+    for index in range(blocks):
+        start = index * block
+        extended = _resample_spectrum(padded[start:start + block + 2 * margin] * taper, block_out + 2 * margin_out)
+        resampled[index * block_out:(index + 1) * block_out] = extended[margin_out:margin_out + block_out]
+    return resampled[:target_length]
+
+def encode_pcm16_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    return wav_header(pcm.nbytes, 1, sample_rate, 16) + pcm.tobytes()
+
+def normalize_wav(buf, target_rate: int) -> bytes:
+    samples, sample_rate = decode_wav(buf)
+    return encode_pcm16_wav(resample(downmix(samples), sample_rate, target_rate), target_rate)
+
+async def decode_with_ffmpeg(buf, target_rate: int) -> bytes:
+    """Decode a compressed upload straight to mono 16-bit PCM at the target rate."""
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-ar", str(target_rate), "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        pcm, stderr = await process.communicate(bytes(buf))
+    except asyncio.CancelledError:
+        # Do not leave the decoder running for a request that is gone
+        process.kill()
+        raise
+    if process.returncode != 0:
+        raise ValueError(f"ffmpeg failed to decode audio: {stderr.decode(errors='replace').strip()}")
+    return wav_header(len(pcm), 1, target_rate, 16) + pcm
+
+def get_normalization_spec(model: str):
+    """Per-model settings from AUDIO_NORMALIZATION, or None to forward audio untouched."""
+    return settings.AUDIO_NORMALIZATION.get(model or "")
+
+async def normalize_audio(audio, filename: str, content_type: str, model: str):
+    """Downmix and resample the upload to the endpoint's expected format.
+
+    Returns the (audio, filename, content_type) to send. Audio that cannot be
+    decoded here is forwarded as-is so the endpoint still gets a chance at it.
+    """
+    spec = get_normalization_spec(model)
+    if not spec or len(audio) == 0:
+        return audio, filename, content_type
+
+    target_rate = int(spec.get("sample_rate", 16000))
+    stem = filename.rsplit(".", 1)[0] if filename else "audio"
+    try:
+        if content_type == "audio/wav":
+            info = parse_wav_header(audio)
+            if (info.audio_format, info.channels, info.sample_rate, info.bits_per_sample) == (WAVE_FORMAT_PCM, 1, target_rate, 16):
+                return audio, filename, content_type
+            # Decoding and FFTs release the GIL for most of their runtime
+            normalized = await asyncio.to_thread(normalize_wav, audio, target_rate)
+            if len(normalized) >= len(audio):
+                return audio, filename, content_type
+        elif spec.get("decode_compressed") and shutil.which("ffmpeg"):
+            # Decoded PCM is larger than mp3/webm; only for endpoints that want uniform input
+            normalized = await decode_with_ffmpeg(audio, target_rate)
+        else:
+            return audio, filename, content_type
+    except ValueError as e:
+        print(f"Audio normalization skipped: {e}")
+        return audio, filename, content_type
+
+    return normalized, f"{stem}.wav", "audio/wav"
@@ -0,0 +1,268 @@
+import struct
+from dataclasses import dataclass
+from app.utils.audio import parse_wav_header
+
+@dataclass
+class AudioProbe:
+    format: str
+    duration: float
+    sample_rate: int
+    channels: int
+    # False when the duration is read from the container, True when inferred from bitrate or timestamps
+    estimated: bool = False
+
+def probe_audio(buf, content_type: str) -> AudioProbe:
+    """Estimate duration and sample format from container headers, without decoding any audio.
+
+    Raises ValueError when the headers cannot be read.
+    """
+    # Released on the way out, so an error's traceback does not keep the upload exported
+    with memoryview(buf) as view:
+        try:
+            if content_type == "audio/wav":
+                info = parse_wav_header(view)
+                return AudioProbe("wav", info.duration, info.sample_rate, info.channels)
+            if content_type == "audio/mpeg":
+                return probe_mp3(view)
+            if content_type == "audio/webm":
+                return probe_webm(view)
+        except struct.error as e:
+            # A header field cut off by the end of the buffer
+            raise ValueError(f"Truncated {content_type} header: {e}") from e
+    raise ValueError(f"No probe for {content_type}")
+
+# MP3
+
+MP3_BITRATES_KBPS = {
+    # (MPEG-1, layer) and (MPEG-2/2.5, layer)
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+MP3_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+MP3_LAYERS = {1: 3, 2: 2, 3: 1}
+MP3_SYNC_SEARCH_BYTES = 64 * 1024
+
+@dataclass
+class Mp3Frame:
+    version: float
+    layer: int
+    bitrate: int
+    sample_rate: int
+    channels: int
+    samples: int
+    length: int
+
+def parse_mp3_frame_header(view, offset: int):
+    """Decode the 4-byte MPEG audio frame header at offset, or None if it is not one."""
+    if offset + 4 > len(view):
+        return None
+    header, = struct.unpack_from(">I", view, offset)
+    if header & 0xFFE00000 != 0xFFE00000:
+        return None
+    version = MP3_VERSIONS.get((header >> 19) & 3)
+    layer = MP3_LAYERS.get((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 0xF
+    sample_rate_index = (header >> 10) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = MP3_BITRATES_KBPS[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header >> 9) & 1
+    channels = 1 if (header >> 6) & 3 == 3 else 2
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return Mp3Frame(version, layer, bitrate, sample_rate, channels, samples, length)
+
+def skip_id3v2(view) -> int:
+    offset = 0
+    while len(view) >= offset + 10 and bytes(view[offset:offset + 3]) == b"ID3":
+        flags = view[offset + 5]
+        size = (view[offset + 6] << 21) | (view[offset + 7] << 14) | (view[offset + 8] << 7) | view[offset + 9]
+        offset += 10 + size + (10 if flags & 0x10 else 0)
+    return offset
+
+def probe_mp3(view) -> AudioProbe:
+    """Duration from the Xing/Info or VBRI frame count, falling back to the first frame's bitrate."""
+    start = skip_id3v2(view)
+    frame = None
+    offset = start
+    end = min(len(view) - 4, start + MP3_SYNC_SEARCH_BYTES)
+    while offset < end:
+        frame = parse_mp3_frame_header(view, offset)
+        # Confirm the sync with the following frame so stray 0xFF bytes are not taken for a header
+        if frame and (offset + frame.length + 4 > len(view) or parse_mp3_frame_header(view, offset + frame.length)):
+            break
+        frame = None
+        offset += 1
+    if frame is None:
+        raise ValueError("No MPEG audio frame found")
+
+    # The VBR header sits in the first frame, right after the side information
+    if frame.version == 1:
+        side_info = 17 if frame.channels == 1 else 32
+    else:
+        side_info = 9 if frame.channels == 1 else 17
+    xing = offset + 4 + side_info
+    frames = None
+    if bytes(view[xing:xing + 4]) in (b"Xing", b"Info") and len(view) >= xing + 12:
+        flags, = struct.unpack_from(">I", view, xing + 4)
+        if flags & 1:
+            frames, = struct.unpack_from(">I", view, xing + 8)
+    elif bytes(view[offset + 36:offset + 40]) == b"VBRI" and len(view) >= offset + 54:
+        frames, = struct.unpack_from(">I", view, offset + 50)
+
+    if frames:
+        return AudioProbe("mp3", frames * frame.samples / frame.sample_rate, frame.sample_rate, frame.channels)
+
+    audio_bytes = len(view) - offset
+    if len(view) >= 128 and bytes(view[-128:-125]) == b"TAG":
+        audio_bytes -= 128
+    return AudioProbe("mp3", audio_bytes * 8 / frame.bitrate, frame.sample_rate, frame.channels, estimated=True)
+
+# WebM / Matroska
+
+EBML_HEADER = 0x1A45DFA3
+SEGMENT = 0x18538067
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+AUDIO = 0xE1
+SAMPLING_FREQUENCY = 0xB5
+CHANNELS = 0x9F
+CLUSTER = 0x1F43B675
+CLUSTER_TIMECODE = 0xE7
+SIMPLE_BLOCK = 0xA3
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+CRC32 = 0xBF
+VOID = 0xEC
+WEBM_TAIL_SEARCH_BYTES = 256 * 1024
+WEBM_MAX_CLUSTER_CANDIDATES = 16
+
+def read_vint(view, offset: int, keep_marker: bool = False):
+    """Read an EBML variable-length integer; sizes with every value bit set mean unknown (None)."""
+    if offset >= len(view) or view[offset] == 0:
+        raise ValueError("Invalid EBML variable-length integer")
+    first = view[offset]
+    length = 9 - first.bit_length()
+    if offset + length > len(view):
+        raise ValueError("Truncated EBML variable-length integer")
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in view[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None
+    return value, offset + length
+
+def ebml_children(view, start: int, end: int):
+    """Yield (id, body offset, body end) for the elements between start and end."""
+    offset = start
+    while offset < end:
+        element_id, offset = read_vint(view, offset, keep_marker=True)
+        size, offset = read_vint(view, offset)
+        body_end = end if size is None else min(offset + size, end)
+        yield element_id, offset, body_end
+        if size is None:
+            return
+        offset = body_end
+
+def read_uint(view, start: int, end: int) -> int:
+    return int.from_bytes(view[start:end], "big")
+
+def read_float(view, start: int, end: int) -> float:
+    return struct.unpack_from(">f" if end - start == 4 else ">d", view, start)[0]
+
+def last_block_timecode(view, scale: int):
+    """Absolute time of the last block, from the last cluster found near the end of the file.
+
+    Browser MediaRecorder output has no Duration element, so it is inferred
+    from block timestamps. Only the last WEBM_TAIL_SEARCH_BYTES are searched
+    and at most WEBM_MAX_CLUSTER_CANDIDATES matches on the cluster ID are
+    tried; a match is only accepted when its first child is a Timecode.
+    """
+    cluster_id = CLUSTER.to_bytes(4, "big")
+    tail_start = max(0, len(view) - WEBM_TAIL_SEARCH_BYTES)
+    tail = bytes(view[tail_start:])
+    position = len(tail)
+    for _ in range(WEBM_MAX_CLUSTER_CANDIDATES):
+        position = tail.rfind(cluster_id, 0, position)
+        if position == -1:
+            break
+        cluster_timecode = None
+        latest = 0
+        try:
+            _, body, body_end = next(ebml_children(view, tail_start + position, len(view)))
+            for element_id, start, end in ebml_children(view, body, body_end):
+                if element_id in (CRC32, VOID):
+                    continue
+                if cluster_timecode is None:
+                    if element_id != CLUSTER_TIMECODE:
+                        break
+                    cluster_timecode = read_uint(view, start, end)
+                elif element_id in (SIMPLE_BLOCK, BLOCK_GROUP):
+                    if element_id == BLOCK_GROUP:
+                        start = next((child_start for child_id, child_start, _ in ebml_children(view, start, end) if child_id == BLOCK), None)
+                    if start is not None and start + 3 <= end:
+                        latest = max(latest, _block_timecode(view, start))
+        except (ValueError, StopIteration, struct.error):
+            # A cut-off final element still leaves the blocks read before it
+            pass
+        if cluster_timecode is not None:
+            return (cluster_timecode + latest) * scale / 1e9
+    raise ValueError("No WebM cluster found")
+
+def _block_timecode(view, offset: int) -> int:
+    _, offset = read_vint(view, offset)  # Track number
+    return struct.unpack_from(">h", view, offset)[0]
+
+def probe_webm(view) -> AudioProbe:
+    """Duration from the segment Info, or from the last block's timestamp when it is absent."""
+    children = ebml_children(view, 0, len(view))
+    element_id, _, _ = next(children, (None, 0, 0))
+    if element_id != EBML_HEADER:
+        raise ValueError("Not an EBML file")
+    element_id, segment_start, segment_end = next(children, (None, 0, 0))
+    if element_id != SEGMENT:
+        raise ValueError("WebM file has no segment")
+
+    scale = 1_000_000
+    duration = None
+    sample_rate = channels = 0
+    for element_id, start, end in ebml_children(view, segment_start, segment_end):
+        if element_id == INFO:
+            for child_id, child_start, child_end in ebml_children(view, start, end):
+                if child_id == TIMECODE_SCALE:
+                    scale = read_uint(view, child_start, child_end)
+                elif child_id == DURATION:
+                    duration = read_float(view, child_start, child_end)
+        elif element_id == TRACKS:
+            for track_id, track_start, track_end in ebml_children(view, start, end):
+                if track_id != TRACK_ENTRY or sample_rate:
+                    continue
+                for child_id, child_start, child_end in ebml_children(view, track_start, track_end):
+                    if child_id != AUDIO:
+                        continue
+                    for audio_id, audio_start, audio_end in ebml_children(view, child_start, child_end):
+                        if audio_id == SAMPLING_FREQUENCY:
+                            sample_rate = int(read_float(view, audio_start, audio_end))
+                        elif audio_id == CHANNELS:
+                            channels = read_uint(view, audio_start, audio_end)
+        elif element_id == CLUSTER:
+            # Metadata comes before the first cluster; everything after it is media
+            break
+
+    if duration is not None:
+        return AudioProbe("webm", duration * scale / 1e9, sample_rate, channels)
+    return AudioProbe("webm", last_block_timecode(view, scale), sample_rate, channels, estimated=True)
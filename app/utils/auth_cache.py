@@ -0,0 +1,110 @@
+import asyncio
+import json
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.config import settings
+from app.db.redis import redis_client
+from app.db.schemas import APIKeyPrincipal, UserDB
+from app.utils.cache import TTLCache
+
+# Hashed API key -> APIKeyPrincipal, per uvicorn worker
+api_key_cache = TTLCache(maxsize=settings.API_KEY_CACHE_MAX_SIZE, ttl=settings.API_KEY_CACHE_TTL_SECONDS)
+
+PRINCIPAL_PROJECTION = {"_id": 0, "email": 1, "balance": 1, "email_verified": 1, "rate_limits": 1, "vad_enabled": 1}
+
+# sha256(JWT) -> verified payload, kept no longer than the token's own expiry
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_MAX_SIZE, ttl=settings.TOKEN_CACHE_MAX_TTL_SECONDS)
+
+# (email, token_version) -> UserDB, or False once that token_version has been revoked
+user_cache = TTLCache(maxsize=settings.USER_CACHE_MAX_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+USER_PROJECTION = {field: 1 for field in UserDB.model_fields}
+
+async def get_api_key_principal(hashed_api_key: str, db: AsyncIOMotorDatabase):
+    """Resolve a hashed API key to its principal, hitting Mongo only on a cache miss."""
+    principal = api_key_cache.get(hashed_api_key)
+    if principal is not None:
+        return principal
+
+    user = await db["users"].find_one({"api_key": hashed_api_key}, PRINCIPAL_PROJECTION)
+    if not user:
+        return None
+
+    principal = APIKeyPrincipal(**user)
+    api_key_cache.set(hashed_api_key, principal)
+    return principal
+
+async def get_token_user(email: str, token_version: int, db: AsyncIOMotorDatabase):
+    """Resolve a token's subject to a UserDB, or None if the user is gone or the token was revoked."""
+    user = user_cache.get((email, token_version))
+    if user is not None:
+        return user or None
+
+    document = await db["users"].find_one({"email": email}, USER_PROJECTION)
+    if not document:
+        return None
+
+    # Password changes bump token_version, which revokes every token issued before
+    if document.get("token_version", 0) != token_version:
+        user_cache.set((email, token_version), False)
+        return None
+
+    user = UserDB(**document)
+    user_cache.set((email, token_version), user)
+    return user
+
+def apply_balance_deltas(deltas: dict):
+    """Adjust cached balance snapshots by per-email deltas already written to Mongo."""
+    for _, principal in api_key_cache.items():
+        if principal.email in deltas:
+            principal.balance += deltas[principal.email]
+    for (email, _), user in user_cache.items():
+        if user and email in deltas:
+            user.balance += deltas[email]
+
+def _apply_invalidation(message: dict):
+    kind, value = message.get("kind"), message.get("value")
+    if kind == "api_key":
+        api_key_cache.pop(value)
+    elif kind == "email":
+        for hashed_api_key, principal in api_key_cache.items():
+            if principal.email == value:
+                api_key_cache.pop(hashed_api_key)
+        # Revoked versions stay cached as False, versions only ever increase
+        for key, user in user_cache.items():
+            if key[0] == value and user:
+                user_cache.pop(key)
+
+async def _publish_invalidation(message: dict):
+    # Drop the local entry right away, other workers catch up through Redis
+    _apply_invalidation(message)
+    try:
+        await redis_client.publish(settings.CACHE_INVALIDATION_CHANNEL, json.dumps(message))
+    except Exception as e:
+        # Other workers fall back to the cache TTL
+        print(f"Failed to publish cache invalidation: {e}")
+
+async def invalidate_api_key(hashed_api_key: str):
+    await _publish_invalidation({"kind": "api_key", "value": hashed_api_key})
+
+async def invalidate_user(email: str):
+    await _publish_invalidation({"kind": "email", "value": email})
+
+async def listen_for_invalidations():
+    """Apply invalidations published by any worker; runs for the application's lifetime."""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _apply_invalidation(json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+            # Messages may have been missed while disconnected
+            api_key_cache.clear()
+            user_cache.clear()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
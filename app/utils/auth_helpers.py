@@ -1,29 +1,24 @@
 import random
 import asyncio
 from fastapi import HTTPException
-from passlib.context import CryptContext
 import datetime
-from app.celery.tasks import send_email_confirmation_otp_email
 from app.core.config import settings
 from jose import jwt, JWTError
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from .async_jose import encode as async_jwt_encode, decode as async_jwt_decode
 
 from app.db.schemas import UserCreate
+from app.utils.auth_cache import invalidate_user
+from app.utils.email_outbox import enqueue_otp_email
+from app.utils.password_hashing import hash_password, verify_and_update_password
 
-pwd_context = CryptContext(
-    schemes=["argon2"],
-    argon2__memory_cost=512,  # Reduce memory cost to lower CPU load
-    argon2__time_cost=2,      # Lower time cost for faster hashing
-)
-
+# Argon2 runs in a dedicated process pool, see app.utils.password_hashing
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, pwd_context.verify, plain_password, hashed_password)
+    valid, _ = await verify_and_update_password(plain_password, hashed_password)
+    return valid
 
 async def get_password_hash(password: str) -> str:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, pwd_context.hash, password)
+    return await hash_password(password)
 
 async def create_access_token(data: dict, token_version: int):
     to_encode = data
@@ -39,7 +34,7 @@ async def create_refresh_token(data: dict, token_version: int):
 async def decode_token(token: str, db: AsyncIOMotorDatabase):
     try:
         # Decode the JWT token
-        payload = async_jwt_decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = await async_jwt_decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email = payload.get("sub")
         
         if email:
@@ -95,7 +90,7 @@ async def resend_and_save_otp(user_email: str, db: AsyncIOMotorDatabase):
             "$unset": {"blocked_until": ""},
         }
     )
-    send_email_confirmation_otp_email.delay(user_email, otp)
+    await enqueue_otp_email("email_confirmation", user_email, otp)
 
 async def verify_otp_attempts(user: dict, otp: int, db: AsyncIOMotorDatabase, current_time: datetime.datetime):
     """Check if the OTP is valid and handle failed attempts."""
@@ -153,3 +148,6 @@ async def change_user_password(
         {"email": user_email},
         {"$set": {"hashed_password": hashed_new_password, "token_version": token_version}}
     )
+
+    # Drop cached sessions in every worker so old tokens stop working immediately
+    await invalidate_user(user_email)
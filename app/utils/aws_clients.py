@@ -1,14 +1,88 @@
+from contextlib import AsyncExitStack
 import aioboto3
+from aiobotocore.config import AioConfig
+from app.core.config import settings
 
-region = 'eu-north-1'
+region = settings.AWS_REGION
 
 session = aioboto3.Session()
 
-# Initialize clients as asynchronous with aioboto3
+def _client_config(retries: dict) -> AioConfig:
+    return AioConfig(
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=settings.AWS_READ_TIMEOUT_SECONDS,
+        retries=retries,
+        connector_args={"keepalive_timeout": settings.AWS_KEEPALIVE_SECONDS},
+    )
+
+# One tuned connection pool per client and uvicorn worker, reused by every request
+client_config = _client_config({"max_attempts": settings.AWS_MAX_ATTEMPTS, "mode": "adaptive"})
+# SageMaker retries are owned by app.utils.resilience; stacking botocore's on top would multiply them
+sagemaker_client_config = _client_config({"total_max_attempts": 1, "mode": "standard"})
+
+_clients = {}
+_exit_stack = None
+
+async def open_aws_clients():
+    """Create the shared clients; called once from the application lifespan."""
+    global _exit_stack
+    _exit_stack = AsyncExitStack()
+    _clients["sagemaker"] = await _exit_stack.enter_async_context(
+        session.client('runtime.sagemaker', region_name=region, config=sagemaker_client_config)
+    )
+    # Inference backends in other regions get a client of their own
+    backend_regions = {
+        backend.get("region") for backend in settings.INFERENCE_BACKENDS
+        if backend.get("type", "sagemaker") == "sagemaker"
+    }
+    for backend_region in backend_regions - {None, region}:
+        _clients[f"sagemaker:{backend_region}"] = await _exit_stack.enter_async_context(
+            session.client('runtime.sagemaker', region_name=backend_region, config=sagemaker_client_config)
+        )
+    _clients["s3"] = await _exit_stack.enter_async_context(
+        session.client('s3', region_name=region, config=client_config)
+    )
+
+async def close_aws_clients():
+    global _exit_stack
+    if _exit_stack is not None:
+        await _exit_stack.aclose()
+        _exit_stack = None
+    _clients.clear()
+
+# Dependencies hand out the shared clients, no per-request setup
 async def get_sagemaker_runtime():
-    async with session.client('runtime.sagemaker', region_name=region) as client:
-        yield client
+    return _clients["sagemaker"]
 
 async def get_s3_client():
-    async with session.client('s3', region_name=region) as client:
-        yield client
\ No newline at end of file
+    return _clients["s3"]
+
+def get_sagemaker_client(client_region: str):
+    return _clients["sagemaker" if client_region == region else f"sagemaker:{client_region}"]
+
+def pool_stats() -> dict:
+    """Connection usage of each client's aiohttp pools.
+
+    aiobotocore keeps one aiohttp session per proxy URL in the endpoint's
+    http_session, created on first use. That layout is private, so a pool
+    whose internals do not match is reported as "unknown" rather than as
+    idle, and without failing /health.
+    """
+    stats = {}
+    for name, client in _clients.items():
+        try:
+            sessions = client._endpoint.http_session._sessions
+            connectors = [session.connector for session in sessions.values() if session.connector is not None]
+            limit = sum(connector.limit for connector in connectors) or settings.AWS_MAX_POOL_CONNECTIONS
+            in_use = sum(len(connector._acquired) for connector in connectors)
+        except AttributeError as e:
+            print(f"Cannot read the {name} connection pool, pool_stats needs updating for this aiobotocore: {e}")
+            stats[name] = "unknown"
+            continue
+        stats[name] = {
+            "max_connections": limit,
+            "in_use": in_use,
+            "saturation": in_use / limit if limit else 0.0,
+        }
+    return stats
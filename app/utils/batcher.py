@@ -0,0 +1,128 @@
+import asyncio
+from app.core.config import settings
+from app.utils.deadline import current_deadline
+from app.utils.inference_router import inference_router
+from app.utils.metrics import INFERENCE_BYTES_SENT, INFERENCE_IN_FLIGHT, time_stage
+from app.utils.resilience import sagemaker_invoker
+from app.utils.streaming_body import MultipartBody, buffer_size
+
+class InferenceBatcher:
+    """Collects short clips for a few milliseconds and sends them as one invocation.
+
+    The endpoint receives the clips as repeated "files" multipart fields and must
+    answer with a JSON list of results in the same order. With batching disabled
+    every clip passes straight through to a single-file invocation. Clips for
+    different models are queued and sent separately.
+    """
+
+    def __init__(self, enabled: bool, window_seconds: float, max_batch_size: int, max_batch_bytes: int, max_clip_bytes: int):
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_clip_bytes = max_clip_bytes
+        self.batches_sent = 0
+        self.clips_batched = 0
+        self.max_queue_depth = 0
+        self._queues = {}  # model -> [(audio, filename, content_type, future)]
+        self._queue_bytes = {}
+        self._timers = {}
+        self._in_flight = set()
+
+    def accepts(self, audio) -> bool:
+        return self.enabled and buffer_size(audio) <= self.max_clip_bytes
+
+    async def submit(self, audio, filename: str, content_type: str, model: str = None):
+        """Queue a clip for the model's next batch and wait for its own result.
+
+        The batch keeps its own copy of the clip, at most max_clip_bytes, so a
+        request that is cancelled can release its upload while co-batched clips
+        are still being sent or retried.
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(model, [])
+        clip = b"".join(audio) if isinstance(audio, (list, tuple)) else bytes(audio)
+        queue.append((clip, filename, content_type, future))
+        self._queue_bytes[model] = self._queue_bytes.get(model, 0) + buffer_size(audio)
+        self.max_queue_depth = max(self.max_queue_depth, len(queue))
+
+        if len(queue) >= self.max_batch_size or self._queue_bytes[model] >= self.max_batch_bytes:
+            self._flush(model)
+        elif model not in self._timers:
+            self._timers[model] = asyncio.get_running_loop().call_later(self.window_seconds, self._flush, model)
+
+        return await future
+
+    def _flush(self, model: str):
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._queues.pop(model, None)
+        self._queue_bytes.pop(model, None)
+        # Clips whose requests were cancelled while queued are not sent at all
+        batch = [item for item in batch or () if not item[3].done()]
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._send(model, batch))
+        # Hold a reference until the batch completes so the task is not collected
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, model: str, batch: list):
+        # The batch serves several requests, none of whose deadlines applies to all of it
+        current_deadline.set(None)
+        failed_backends = set()
+
+        async def attempt():
+            # Retries and hedges leave out clips whose requests have been cancelled since
+            live = [item for item in batch if not item[3].done()]
+            if not live:
+                return live, []
+            body = MultipartBody.batch([(audio, filename, content_type) for audio, filename, content_type, _ in live])
+            try:
+                with INFERENCE_IN_FLIGHT.track_inprogress(), time_stage("batch_inference"):
+                    INFERENCE_BYTES_SENT.inc(len(body))
+                    return live, await inference_router.invoke(model, body, failed_backends)
+            finally:
+                body.close()
+
+        try:
+            batch, results = await sagemaker_invoker.call(attempt)
+            if not isinstance(results, list) or len(results) != len(batch):
+                raise ValueError(f"Batched invocation returned {len(results) if isinstance(results, list) else 'no'} results for {len(batch)} clips")
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if not batch:
+            return
+
+        self.batches_sent += 1
+        self.clips_batched += len(batch)
+        for (*_, future), result in zip(batch, results):
+            # The waiting request may have been cancelled meanwhile
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_seconds": self.window_seconds,
+            "max_batch_size": self.max_batch_size,
+            "max_batch_bytes": self.max_batch_bytes,
+            "queue_depth": sum(len(queue) for queue in self._queues.values()),
+            "max_queue_depth": self.max_queue_depth,
+            "batches_in_flight": len(self._in_flight),
+            "batches_sent": self.batches_sent,
+            "average_batch_size": self.clips_batched / self.batches_sent if self.batches_sent else 0.0,
+        }
+
+inference_batcher = InferenceBatcher(
+    enabled=settings.INFERENCE_BATCHING_ENABLED,
+    window_seconds=settings.INFERENCE_BATCH_WINDOW_MS / 1000,
+    max_batch_size=settings.INFERENCE_BATCH_MAX_SIZE,
+    max_batch_bytes=settings.INFERENCE_BATCH_MAX_BYTES,
+    max_clip_bytes=settings.INFERENCE_BATCH_MAX_CLIP_BYTES,
+)
@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import time
+from fastapi import HTTPException
+from app.core.config import settings
+from app.utils.metrics import INFERENCE_WASTED_SECONDS
+
+class Deadline:
+    """When a request has to be answered by, and why its work was cancelled, if it was.
+
+    inference_seconds adds up the inference calls that completed for the
+    request; they are wasted when the request is cancelled afterwards.
+    """
+
+    def __init__(self, seconds: float, elapsed: float = 0.0):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds - elapsed
+        self.cancel_reason = None
+        self.inference_seconds = 0.0
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+def request_timeout(timeout: float = None) -> float:
+    """The x-request-timeout header in seconds, or the default, capped at the maximum."""
+    if timeout is None:
+        return settings.TRANSCRIBE_DEFAULT_TIMEOUT_SECONDS
+    if timeout <= 0:
+        raise HTTPException(status_code=400, detail="x-request-timeout must be a positive number of seconds.")
+    return min(timeout, settings.TRANSCRIBE_MAX_TIMEOUT_SECONDS)
+
+def request_deadline(request, timeout: float) -> Deadline:
+    # Counted from the request's arrival, so time spent receiving the upload is included
+    started = request.scope.get("state", {}).get("request_started")
+    return Deadline(timeout, time.perf_counter() - started if started is not None else 0.0)
+
+def deadline_exceeded(deadline: Deadline) -> HTTPException:
+    return HTTPException(status_code=504, detail=f"Transcription did not finish within {deadline.seconds:g}s.")
+
+def remaining_seconds():
+    """Seconds left before the current request's deadline, or None outside of one."""
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+def inference_timeout():
+    """Seconds an inference call may take under the current deadline, None when there is none.
+
+    Raises 504 when the deadline has already passed, so no call is started
+    that could not be answered in time.
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    if deadline.expired:
+        raise deadline_exceeded(deadline)
+    return deadline.remaining()
+
+def cancel_reason() -> str:
+    deadline = current_deadline.get()
+    if deadline is not None and deadline.cancel_reason:
+        return deadline.cancel_reason
+    if deadline is not None and deadline.expired:
+        return "deadline"
+    # The call lost a hedge race, or its caller went away for another cause
+    return "abandoned"
+
+async def wait_for_disconnect(request):
+    # Handlers run once the body has been read, so the next message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+async def run_request(request, deadline: Deadline, work):
+    """Run work() under the deadline, and cancel it as soon as the client disconnects.
+
+    Raises 504 when the deadline passes and 499 when the client has gone.
+    Either way, inference that already completed for the request is counted
+    as wasted, and the caller bills nothing.
+    """
+    token = current_deadline.set(deadline)
+    try:
+        work_task = asyncio.create_task(work())
+    finally:
+        current_deadline.reset(token)
+    disconnect_task = asyncio.create_task(wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait(
+            {work_task, disconnect_task}, timeout=max(deadline.remaining(), 0), return_when=asyncio.FIRST_COMPLETED
+        )
+    except asyncio.CancelledError:
+        work_task.cancel()
+        raise
+    finally:
+        disconnect_task.cancel()
+
+    if work_task in done:
+        if work_task.exception() is not None and deadline.expired:
+            # An inference call hit the deadline first and answered 504 itself
+            INFERENCE_WASTED_SECONDS.labels(reason="deadline").inc(deadline.inference_seconds)
+        return work_task.result()
+
+    deadline.cancel_reason = "disconnect" if disconnect_task in done else "deadline"
+    work_task.cancel()
+    # Let the cancellation unwind so in-flight calls record what they had spent
+    await asyncio.gather(work_task, return_exceptions=True)
+    INFERENCE_WASTED_SECONDS.labels(reason=deadline.cancel_reason).inc(deadline.inference_seconds)
+    if deadline.cancel_reason == "disconnect":
+        # Nobody will read it; nginx's code for a client that closed the request
+        raise HTTPException(status_code=499, detail="Client closed request.")
+    raise deadline_exceeded(deadline)
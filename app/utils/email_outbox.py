@@ -0,0 +1,29 @@
+import json
+from app.celery.tasks import (
+    OTP_FLUSH_SCHEDULED_KEY,
+    OTP_OUTBOX_KEY,
+    flush_otp_email_outbox,
+    send_email_confirmation_otp_email,
+    send_password_reset_otp_email,
+)
+from app.core.config import settings
+from app.db.redis import redis_client
+
+OTP_TASKS = {
+    "email_confirmation": send_email_confirmation_otp_email,
+    "password_reset": send_password_reset_otp_email,
+}
+
+async def enqueue_otp_email(kind: str, email: str, otp):
+    """Hand an OTP email to the Celery worker, one task per message or through the batched outbox."""
+    # The outbox stores messages as JSON, and the email template expects the code itself
+    if not isinstance(otp, int):
+        raise TypeError(f"OTP must be an int, got {type(otp).__name__}")
+    if not settings.SMTP_BATCHING_ENABLED:
+        OTP_TASKS[kind].delay(email, otp)
+        return
+
+    await redis_client.rpush(OTP_OUTBOX_KEY, json.dumps([kind, email, otp]))
+    # The first message of a window schedules the flush; the key expiring covers a lost flush task
+    if await redis_client.set(OTP_FLUSH_SCHEDULED_KEY, 1, nx=True, ex=int(settings.SMTP_BATCH_WINDOW_SECONDS) + 30):
+        flush_otp_email_outbox.apply_async(countdown=settings.SMTP_BATCH_WINDOW_SECONDS)
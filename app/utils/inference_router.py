@@ -0,0 +1,283 @@
+import asyncio
+import json
+import random
+import time
+import aiohttp
+from botocore.exceptions import ClientError, HTTPClientError
+from fastapi import HTTPException
+from app.core.config import settings
+from app.utils.aws_clients import get_sagemaker_client, region as default_region
+from app.utils.deadline import cancel_reason, current_deadline, deadline_exceeded, inference_timeout
+from app.utils.metrics import INFERENCE_BACKEND_REQUESTS, INFERENCE_CANCELLED_SECONDS
+from app.utils.resilience import CircuitBreaker, is_retryable
+
+class InferenceBackend:
+    """One place a model can be invoked, with the routing state the router keeps for it.
+
+    Subclasses implement invoke(body) for a MultipartBody and return the
+    endpoint's parsed JSON answer.
+    """
+
+    kind = "backend"
+
+    def __init__(self, name: str, model: str, weight: float = 1.0, canary: bool = False):
+        self.name = name
+        self.model = model
+        self.weight = weight
+        self.canary = canary
+        self.outstanding = 0
+        self.latency_ewma = None
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        # Each backend fails fast on its own, so one broken backend does not block the others
+        self.breaker = CircuitBreaker(settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD, settings.CIRCUIT_BREAKER_RESET_SECONDS)
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > time.monotonic()
+
+    def score(self) -> float:
+        # Unmeasured backends score as instant so they get traffic and a latency estimate
+        return (self.outstanding + 1) * (self.latency_ewma or 0.0)
+
+    def record_success(self, seconds: float, alpha: float):
+        self.consecutive_failures = 0
+        self.latency_ewma = seconds if self.latency_ewma is None else alpha * seconds + (1 - alpha) * self.latency_ewma
+
+    def record_failure(self, eject_after: int, eject_seconds: float, eject_max_seconds: float):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= eject_after and not self.ejected:
+            # Each ejection in a row lasts twice as long as the previous one
+            self.ejections += 1
+            self.ejected_until = time.monotonic() + min(eject_max_seconds, eject_seconds * 2 ** (self.ejections - 1))
+            self.consecutive_failures = 0
+
+    async def invoke(self, body) -> dict:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "model": self.model,
+            "weight": self.weight,
+            "canary": self.canary,
+            "outstanding": self.outstanding,
+            "latency_ewma_seconds": self.latency_ewma,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.ejected,
+            "ejections": self.ejections,
+            "breaker": self.breaker.stats(),
+        }
+
+class SageMakerBackend(InferenceBackend):
+    """A SageMaker real-time endpoint, optionally pinned to one production variant."""
+
+    kind = "sagemaker"
+
+    def __init__(self, name: str, model: str, endpoint_name: str, region: str = None, variant: str = None, **kwargs):
+        super().__init__(name, model, **kwargs)
+        self.endpoint_name = endpoint_name
+        self.region = region or default_region
+        self.variant = variant
+
+    async def invoke(self, body) -> dict:
+        request = {"EndpointName": self.endpoint_name, "ContentType": body.content_type, "Body": body}
+        if self.variant:
+            request["TargetVariant"] = self.variant
+        response = await get_sagemaker_client(self.region).invoke_endpoint(**request)
+        return json.loads(await response["Body"].read())
+
+class LocalHTTPBackend(InferenceBackend):
+    """A model server reachable over plain HTTP that takes the same multipart form as the endpoint.
+
+    Meant for running the router offline against a local container. Errors
+    are raised as botocore exceptions so retries and ejection treat them like
+    SageMaker's.
+    """
+
+    kind = "http"
+
+    def __init__(self, name: str, model: str, url: str, **kwargs):
+        super().__init__(name, model, **kwargs)
+        self.url = url
+        self._session = None
+
+    async def invoke(self, body) -> dict:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(sock_connect=settings.AWS_CONNECT_TIMEOUT_SECONDS, sock_read=settings.AWS_READ_TIMEOUT_SECONDS)
+            )
+        try:
+            async with self._session.post(
+                self.url,
+                data=body,
+                headers={"Content-Type": body.content_type, "Content-Length": str(len(body))}
+            ) as response:
+                payload = await response.read()
+                if response.status >= 400:
+                    raise ClientError(
+                        {
+                            "Error": {"Code": str(response.status), "Message": payload[:200].decode(errors="replace")},
+                            "ResponseMetadata": {"HTTPStatusCode": response.status},
+                        },
+                        "InvokeEndpoint"
+                    )
+                return json.loads(payload)
+        except aiohttp.ClientConnectionError as e:
+            raise HTTPClientError(error=e)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> dict:
+        return {**super().stats(), "url": self.url}
+
+BACKEND_TYPES = {"sagemaker": SageMakerBackend, "http": LocalHTTPBackend}
+
+def build_backends(config: list) -> list:
+    """Backends from INFERENCE_BACKENDS, or the single SAGEMAKER_ENDPOINT_NAME endpoint when it is empty.
+
+    Each entry names a "type" (sagemaker or http), a "model" and the
+    type's own fields, plus optional "name", "weight" and "canary".
+    """
+    if not config:
+        return [SageMakerBackend(
+            name=settings.SAGEMAKER_ENDPOINT_NAME or "default",
+            model=settings.SAGEMAKER_ENDPOINT_NAME or "default",
+            endpoint_name=settings.SAGEMAKER_ENDPOINT_NAME,
+        )]
+
+    backends = []
+    for index, entry in enumerate(config):
+        entry = dict(entry)
+        backend_type = BACKEND_TYPES[entry.pop("type", "sagemaker")]
+        entry.setdefault("name", entry.get("endpoint_name") or entry.get("url") or f"backend-{index}")
+        backends.append(backend_type(**entry))
+    return backends
+
+class InferenceRouter:
+    """Spreads invocations of a model over its backends.
+
+    Canary backends receive their share of the model's total weight. Within
+    the canary or stable group, two backends are drawn by weight and the one
+    with the lower (outstanding + 1) x latency EWMA wins. Backends failing
+    eject_after retryable calls in a row are ejected for a growing period,
+    and each backend has its own circuit breaker; when every backend of a
+    model is out, the one due back soonest is tried anyway. Retries of a
+    call pass the backends that already failed it as exclude, so they move
+    on to another backend while one is left.
+
+    Calls made under a request deadline are cut off when it passes; that
+    counts against the request, not the backend.
+    """
+
+    def __init__(self, backends: list, default_model: str, ewma_alpha: float, eject_after: int, eject_seconds: float, eject_max_seconds: float):
+        self.backends = backends
+        self.default_model = default_model or backends[0].model
+        self.ewma_alpha = ewma_alpha
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.eject_max_seconds = eject_max_seconds
+        self.models = {}
+        for backend in backends:
+            self.models.setdefault(backend.model, []).append(backend)
+
+    def resolve(self, model: str = None) -> str:
+        """The model a request asked for, or the default; unknown models are the client's error."""
+        model = model or self.default_model
+        if model not in self.models:
+            raise HTTPException(status_code=400, detail=f"Unknown model '{model}'. Available: {', '.join(sorted(self.models))}")
+        return model
+
+    def choose(self, model: str = None, exclude: set = None) -> InferenceBackend:
+        candidates = self.models[self.resolve(model)]
+        healthy = [backend for backend in candidates if not backend.ejected and backend.breaker.available()]
+        if exclude:
+            healthy = [backend for backend in healthy if backend.name not in exclude] or healthy
+        if not healthy:
+            # Prefer a backend whose breaker lets the call through over one that would fail fast
+            return min(candidates, key=lambda backend: (not backend.breaker.available(), backend.ejected_until))
+
+        canaries = [backend for backend in healthy if backend.canary]
+        stable = [backend for backend in healthy if not backend.canary] or canaries
+        group = stable
+        if canaries and stable is not canaries:
+            canary_weight = sum(backend.weight for backend in canaries)
+            if random.uniform(0, canary_weight + sum(backend.weight for backend in stable)) < canary_weight:
+                group = canaries
+
+        if len(group) == 1:
+            return group[0]
+        first, second = random.choices(group, weights=[backend.weight for backend in group], k=2)
+        return first if first.score() <= second.score() else second
+
+    async def invoke(self, model: str, body, exclude: set = None) -> dict:
+        deadline_scope = asyncio.timeout(inference_timeout())
+        backend = self.choose(model, exclude)
+        # Raises 503 when every backend of the model has its breaker open
+        backend.breaker.before_call()
+        backend.outstanding += 1
+        backend.requests += 1
+        started = time.monotonic()
+        try:
+            async with deadline_scope:
+                result = await backend.invoke(body)
+        except asyncio.CancelledError:
+            backend.breaker.release_trial()
+            INFERENCE_CANCELLED_SECONDS.labels(reason=cancel_reason()).inc(time.monotonic() - started)
+            INFERENCE_BACKEND_REQUESTS.labels(backend=backend.name, outcome="cancelled").inc()
+            raise
+        except Exception as e:
+            if deadline_scope.expired() or not is_retryable(e):
+                # A missed deadline or a client error says nothing about the backend's health
+                backend.breaker.release_trial()
+            if deadline_scope.expired():
+                INFERENCE_CANCELLED_SECONDS.labels(reason="deadline").inc(time.monotonic() - started)
+                INFERENCE_BACKEND_REQUESTS.labels(backend=backend.name, outcome="deadline").inc()
+                raise deadline_exceeded(current_deadline.get()) from e
+            if is_retryable(e):
+                backend.breaker.record_failure()
+                backend.record_failure(self.eject_after, self.eject_seconds, self.eject_max_seconds)
+                if exclude is not None:
+                    exclude.add(backend.name)
+            INFERENCE_BACKEND_REQUESTS.labels(backend=backend.name, outcome="error").inc()
+            raise
+        finally:
+            backend.outstanding -= 1
+        elapsed = time.monotonic() - started
+        backend.breaker.record_success()
+        backend.record_success(elapsed, self.ewma_alpha)
+        deadline = current_deadline.get()
+        if deadline is not None:
+            deadline.inference_seconds += elapsed
+        INFERENCE_BACKEND_REQUESTS.labels(backend=backend.name, outcome="success").inc()
+        return result
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "default_model": self.default_model,
+            "backends": {backend.name: backend.stats() for backend in self.backends},
+        }
+
+inference_router = InferenceRouter(
+    backends=build_backends(settings.INFERENCE_BACKENDS),
+    default_model=settings.INFERENCE_DEFAULT_MODEL,
+    ewma_alpha=settings.ROUTER_EWMA_ALPHA,
+    eject_after=settings.ROUTER_EJECT_AFTER_FAILURES,
+    eject_seconds=settings.ROUTER_EJECT_SECONDS,
+    eject_max_seconds=settings.ROUTER_EJECT_MAX_SECONDS,
+)
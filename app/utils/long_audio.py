@@ -0,0 +1,88 @@
+import asyncio
+import string
+from app.core.config import settings
+from app.utils.audio import parse_wav_header, wav_header
+from app.utils.stt_helpers import invoke_stt_audio
+
+MAX_OVERLAP_WORDS = 20
+
+def split_wav_windows(audio, window_seconds: float, overlap_seconds: float):
+    """Split a WAV buffer into overlapping windows of (header, samples) buffer pairs.
+
+    The samples are memoryview slices of the original buffer, so no audio is copied.
+    """
+    info = parse_wav_header(audio)
+    view = memoryview(audio)
+    window_size = int(window_seconds * info.sample_rate) * info.block_align
+    step = window_size - int(overlap_seconds * info.sample_rate) * info.block_align
+    if step <= 0:
+        raise ValueError("Long audio overlap must be shorter than the window")
+
+    windows = []
+    start = 0
+    while True:
+        size = min(window_size, info.data_size - start)
+        samples = view[info.data_offset + start:info.data_offset + start + size]
+        header = wav_header(size, info.channels, info.sample_rate, info.bits_per_sample, info.audio_format)
+        windows.append((header, samples))
+        # Stop once this window reaches the end, the next one would only repeat the overlap
+        if start + size >= info.data_size:
+            break
+        start += step
+    return windows
+
+def _normalize_word(word: str) -> str:
+    return word.strip(string.punctuation).lower()
+
+def stitch_transcripts(parts: list, max_overlap_words: int = MAX_OVERLAP_WORDS) -> str:
+    """Join window transcripts, dropping words repeated across the overlap.
+
+    The longest run of words that ends one transcript and starts the next is
+    treated as the overlap and kept only once.
+    """
+    words = []
+    for part in parts:
+        new_words = part.split()
+        overlap = 0
+        for size in range(min(max_overlap_words, len(words), len(new_words)), 0, -1):
+            tail = [_normalize_word(word) for word in words[-size:]]
+            head = [_normalize_word(word) for word in new_words[:size]]
+            if tail == head:
+                overlap = size
+                break
+        words.extend(new_words[overlap:])
+    return " ".join(words)
+
+async def invoke_stt_windows(windows: list, filename: str, content_type: str, model: str, max_concurrency: int, overlap_seconds: float = 0.0):
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def invoke_window(window):
+        async with semaphore:
+            return await invoke_stt_audio(window, filename, content_type, model)
+
+    results = await asyncio.gather(*(invoke_window(window) for window in windows))
+    # Bill the recording once: every window after the first repeats overlap_seconds of its predecessor
+    processed = sum(result.get("duration", 1) for result in results)
+    return {
+        "prediction": stitch_transcripts([result.get("prediction", "").strip() for result in results]),
+        "duration": max(processed - (len(results) - 1) * overlap_seconds, 0),
+        "chunks": len(results),
+    }
+
+async def invoke_stt_long_audio(audio, filename: str, content_type: str, model: str = None):
+    """Transcribe audio as concurrent overlapping windows when it is long enough.
+
+    Only WAV audio can be windowed without decoding; other formats and short
+    recordings go to the endpoint as a single invocation.
+    """
+    if content_type == "audio/wav":
+        try:
+            windows = split_wav_windows(audio, settings.LONG_AUDIO_WINDOW_SECONDS, settings.LONG_AUDIO_OVERLAP_SECONDS)
+        except ValueError:
+            windows = None
+        if windows and len(windows) > 1:
+            return await invoke_stt_windows(
+                windows, filename, content_type, model, settings.LONG_AUDIO_MAX_CONCURRENCY, settings.LONG_AUDIO_OVERLAP_SECONDS
+            )
+
+    return await invoke_stt_audio(audio, filename, content_type, model)
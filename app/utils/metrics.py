@@ -0,0 +1,122 @@
+import os
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from starlette.responses import Response
+
+# Transcriptions run from milliseconds to minutes, beyond the default buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+TRANSCRIBE_STAGE_SECONDS = Histogram(
+    "stt_transcribe_stage_duration_seconds",
+    "Time spent in each stage of a transcription",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+INFERENCE_IN_FLIGHT = Gauge(
+    "stt_inference_in_flight",
+    "SageMaker invocations currently awaiting a response",
+    multiprocess_mode="livesum",
+)
+INFERENCE_BACKEND_REQUESTS = Counter(
+    "stt_inference_backend_requests",
+    "Invocations routed to each inference backend",
+    ["backend", "outcome"],
+)
+INFERENCE_CANCELLED_SECONDS = Counter(
+    "stt_inference_cancelled_seconds",
+    "Time in-flight inference calls had run when they were cancelled",
+    ["reason"],
+)
+INFERENCE_WASTED_SECONDS = Counter(
+    "stt_inference_wasted_seconds",
+    "Completed inference discarded because its request was cancelled afterwards",
+    ["reason"],
+)
+INFERENCE_BYTES_SENT = Counter(
+    "stt_inference_bytes_sent",
+    "Request body bytes sent to the inference endpoint",
+)
+AUDIO_SECONDS_PROCESSED = Counter(
+    "stt_audio_seconds_processed",
+    "Seconds of audio transcribed and billed",
+    ["source"],
+)
+VAD_AUDIO_SECONDS = Counter(
+    "stt_vad_audio_seconds",
+    "Seconds of audio kept or removed by silence trimming before inference",
+    ["outcome"],
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds",
+    "Argon2 hash and verify latency including time queued for the process pool",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "password_hash_in_flight",
+    "Argon2 operations running or queued in the process pool",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected",
+    "Argon2 operations rejected because the process pool queue was full",
+)
+
+def time_stage(stage: str):
+    """Context manager recording the enclosed block under a transcription stage."""
+    return TRANSCRIBE_STAGE_SECONDS.labels(stage=stage).time()
+
+def record_upload_stage(request):
+    """Observe the time from the request's arrival until its body was parsed."""
+    started = request.scope.get("state", {}).get("request_started")
+    if started is not None:
+        TRANSCRIBE_STAGE_SECONDS.labels(stage="read_upload").observe(time.perf_counter() - started)
+
+def metrics_response() -> Response:
+    # With several uvicorn workers each process writes its samples to
+    # PROMETHEUS_MULTIPROC_DIR and a scrape aggregates them all
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+class PrometheusMiddleware:
+    """Records request latency labelled by route template rather than raw path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        # Handlers read this to time what happens before they run, like receiving the upload
+        scope.setdefault("state", {})["request_started"] = started
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status["code"]),
+            ).observe(time.perf_counter() - started)
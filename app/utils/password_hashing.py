@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from app.core.config import settings
+from app.utils.metrics import PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__time_cost=settings.ARGON2_TIME_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
+
+# Run in the pool's worker processes
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+class PasswordHasherPool:
+    """Runs argon2 in its own process pool so hashing never competes with the event loop.
+
+    At most max_workers operations run at once and max_queue more may wait;
+    anything beyond that is rejected straight away with a 503 instead of
+    piling up behind a login storm. Every uvicorn worker has its own pool,
+    so the module-level pool gets this worker's share of the machine-wide
+    PASSWORD_HASH_WORKERS.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so each uvicorn worker gets its own pool after forking
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def run(self, operation: str, fn, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            PASSWORD_HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is busy. Please retry shortly.",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            with PASSWORD_HASH_IN_FLIGHT.track_inprogress():
+                result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            # A crashed worker poisons the pool; start a fresh one for the next call
+            self._executor = None
+            self.failed += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            PASSWORD_HASH_SECONDS.labels(operation=operation).observe(time.perf_counter() - started)
+        self.completed += 1
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+password_hasher = PasswordHasherPool(
+    max_workers=max(1, settings.PASSWORD_HASH_WORKERS // max(1, settings.WEB_CONCURRENCY)),
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS,
+)
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run("hash", _hash, password)
+
+async def verify_and_update_password(password: str, hashed_password: str):
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses outdated parameters."""
+    return await password_hasher.run("verify", _verify_and_update, password, hashed_password)
@@ -0,0 +1,146 @@
+import math
+import time
+from fastapi import HTTPException
+from app.core.config import settings
+from app.db.redis import redis_client
+from app.db.schemas import APIKeyPrincipal
+
+# Refills and charges every bucket in KEYS atomically. ARGV holds a
+# (capacity, refill per second, cost) triplet per key followed by a force flag.
+# Without force nothing is charged unless every bucket has a positive balance
+# covering its cost; with force the cost is always charged, possibly going
+# negative, which is how usage known only after the fact is debited.
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local force = ARGV[#ARGV] == '1'
+local tokens = {}
+local retry_after = 0
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local cost = tonumber(ARGV[i * 3])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    available = math.min(capacity, available + math.max(0, now - updated_at) * rate)
+    tokens[i] = available
+    if not force and (available < cost or available <= 0) then
+        retry_after = math.max(retry_after, (math.max(cost, 1) - available) / rate)
+    end
+end
+
+local allowed = force or retry_after == 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local remaining = tokens[i]
+    if allowed then
+        remaining = remaining - tonumber(ARGV[i * 3])
+    end
+    redis.call('HSET', key, 'tokens', remaining, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 60)
+end
+
+return {allowed and 1 or 0, tostring(retry_after)}
+"""
+
+class RateLimiter:
+    """Per-API-key and per-user token buckets shared by all workers through Redis.
+
+    Limits come from the user's rate_limits document, falling back to the
+    defaults in settings. A denial is remembered locally until its retry-after
+    passes, so a client hammering a limit does not cost a Redis round trip per
+    request. Redis failures fail open.
+    """
+
+    def __init__(self):
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._blocked_until = {}
+        self.allowed = 0
+        self.denied = 0
+        self.local_denials = 0
+
+    @staticmethod
+    def limits_for(principal: APIKeyPrincipal) -> dict:
+        limits = principal.rate_limits or {}
+        return {
+            "requests_per_second": float(limits.get("requests_per_second", settings.RATE_LIMIT_REQUESTS_PER_SECOND)),
+            "request_burst": float(limits.get("request_burst", settings.RATE_LIMIT_REQUEST_BURST)),
+            "audio_seconds_per_minute": float(limits.get("audio_seconds_per_minute", settings.RATE_LIMIT_AUDIO_SECONDS_PER_MINUTE)),
+        }
+
+    def _request_buckets(self, hashed_api_key: str, principal: APIKeyPrincipal) -> dict:
+        limits = self.limits_for(principal)
+        request_bucket = (limits["request_burst"], limits["requests_per_second"], 1)
+        return {
+            f"stt:rl:key:{hashed_api_key}:requests": request_bucket,
+            f"stt:rl:user:{principal.email}:requests": request_bucket,
+        }
+
+    def _audio_bucket(self, principal: APIKeyPrincipal, audio_seconds: float) -> dict:
+        audio_per_minute = self.limits_for(principal)["audio_seconds_per_minute"]
+        return {f"stt:rl:user:{principal.email}:audio": (audio_per_minute, audio_per_minute / 60, audio_seconds)}
+
+    async def _run(self, buckets: dict, force: bool):
+        args = [value for bucket in buckets.values() for value in bucket] + [1 if force else 0]
+        allowed, retry_after = await self._script(keys=list(buckets), args=args)
+        return bool(allowed), float(retry_after)
+
+    def _deny(self, retry_after: float):
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded. Please slow down.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    async def check(self, hashed_api_key: str, principal: APIKeyPrincipal):
+        """Charge one request and require audio budget left, or raise 429."""
+        now = time.monotonic()
+        blocked_until = self._blocked_until.get(principal.email, 0)
+        if blocked_until > now:
+            self.local_denials += 1
+            self._deny(blocked_until - now)
+
+        buckets = {**self._request_buckets(hashed_api_key, principal), **self._audio_bucket(principal, 0.0)}
+        try:
+            allowed, retry_after = await self._run(buckets, force=False)
+        except Exception as e:
+            print(f"Rate limiter unavailable, allowing request: {e}")
+            return
+
+        if not allowed:
+            self.denied += 1
+            if len(self._blocked_until) >= settings.RATE_LIMIT_LOCAL_BLOCK_MAX_SIZE:
+                self._blocked_until = {email: until for email, until in self._blocked_until.items() if until > now}
+            self._blocked_until[principal.email] = now + retry_after
+            self._deny(retry_after)
+        self._blocked_until.pop(principal.email, None)
+        self.allowed += 1
+
+    async def try_debit_audio(self, principal: APIKeyPrincipal, audio_seconds: float) -> bool:
+        """Charge audio seconds only if the budget covers them, for work that can be skipped."""
+        try:
+            allowed, _ = await self._run(self._audio_bucket(principal, audio_seconds), force=False)
+        except Exception as e:
+            print(f"Rate limiter unavailable, allowing audio: {e}")
+            return True
+        return allowed
+
+    async def debit_audio(self, principal: APIKeyPrincipal, audio_seconds: float):
+        """Charge transcribed audio seconds once the duration is known."""
+        try:
+            await self._run(self._audio_bucket(principal, audio_seconds), force=True)
+        except Exception as e:
+            print(f"Rate limiter unavailable, audio not debited: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "denied": self.denied,
+            "local_denials": self.local_denials,
+            "locally_blocked": sum(1 for until in self._blocked_until.values() if until > time.monotonic()),
+        }
+
+rate_limiter = RateLimiter()
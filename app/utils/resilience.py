@@ -0,0 +1,196 @@
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+from fastapi import HTTPException
+from app.core.config import settings
+from app.utils.deadline import remaining_seconds
+
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailable",
+    "InternalFailure",
+    "ModelNotReadyException",
+}
+
+def is_retryable(error: Exception) -> bool:
+    """Throttling, 5xx and transport failures are worth another attempt; client errors are not."""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in RETRYABLE_ERROR_CODES or status == 429 or status >= 500
+    return isinstance(error, (BotocoreConnectionError, HTTPClientError, asyncio.TimeoutError))
+
+class CircuitBreaker:
+    """Fails fast after consecutive failures, then lets a single trial call through."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Transcription service is temporarily unavailable. Please retry later.",
+                    headers={"Retry-After": str(max(1, math.ceil(remaining)))}
+                )
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            # Only one probe at a time while the endpoint's health is unknown
+            if self._trial_in_flight:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Transcription service is temporarily unavailable. Please retry later.",
+                    headers={"Retry-After": "1"}
+                )
+            self._trial_in_flight = True
+
+    def available(self) -> bool:
+        """Whether before_call would let a call through right now, without changing any state."""
+        if self.state == self.OPEN:
+            return self._opened_at + self.reset_timeout <= time.monotonic()
+        return not (self.state == self.HALF_OPEN and self._trial_in_flight)
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        # A probe that ended without a verdict (cancelled, client error) frees the slot
+        self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float):
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class ResilientInvoker:
+    """Retries with capped full-jitter backoff, with optional hedging.
+
+    Calls are zero-argument coroutine factories so every attempt, and every
+    hedge, gets its own fresh request body. Circuit breaking is per backend,
+    in the inference router, so one failing backend does not stop calls to
+    the others.
+    """
+
+    def __init__(self, max_attempts: int, backoff_base: float, backoff_cap: float, hedging: bool):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedging = hedging
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def call(self, attempt):
+        self.calls += 1
+        for attempt_number in range(self.max_attempts):
+            started = time.monotonic()
+            try:
+                result = await (self._hedged(attempt) if self.hedging else attempt())
+            except Exception as e:
+                if not is_retryable(e) or attempt_number == self.max_attempts - 1:
+                    raise
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt_number))
+                remaining = remaining_seconds()
+                if remaining is not None and remaining <= delay:
+                    # The retry could not start before the request's deadline
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+
+            self.latency.record(time.monotonic() - started)
+            return result
+
+    async def _hedged(self, attempt):
+        """Fire a second attempt if the first is slower than the recent p95; keep the first answer."""
+        primary = asyncio.create_task(attempt())
+        tasks = {primary}
+        try:
+            delay = self.latency.percentile(0.95)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self.hedges += 1
+                    tasks.add(asyncio.create_task(attempt()))
+
+            error = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedging": self.hedging,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_seconds": self.latency.percentile(0.95),
+        }
+
+sagemaker_invoker = ResilientInvoker(
+    max_attempts=settings.INVOKE_MAX_ATTEMPTS,
+    backoff_base=settings.INVOKE_BACKOFF_BASE_SECONDS,
+    backoff_cap=settings.INVOKE_BACKOFF_CAP_SECONDS,
+    hedging=settings.INVOKE_HEDGING_ENABLED,
+)
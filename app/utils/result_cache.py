@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+from app.core.config import settings
+from app.db.redis import redis_client
+from app.utils.cache import TTLCache
+from app.utils.streaming_body import open_upload_buffer
+
+# Hashing a few megabytes holds the event loop for milliseconds, so do it off-loop
+HASH_IN_THREAD_BYTES = 256 * 1024
+
+async def audio_cache_key(file, *variant: str) -> str:
+    """Content address of an upload, scoped to the model and transcription mode."""
+    with open_upload_buffer(file.file) as audio:
+        return await content_cache_key(audio, *variant)
+
+async def content_cache_key(audio, *variant: str) -> str:
+    """Content address of audio already in memory, e.g. a file taken from a batch."""
+    if len(audio) > HASH_IN_THREAD_BYTES:
+        digest = await asyncio.to_thread(lambda: hashlib.sha256(audio).hexdigest())
+    else:
+        digest = hashlib.sha256(audio).hexdigest()
+    return ":".join((*variant, digest))
+
+class TranscriptionResultCache:
+    """Two-tier transcript cache with in-flight coalescing of identical uploads.
+
+    The in-memory LRU tier is per worker; the optional Redis tier is shared by
+    every worker and node. Concurrent misses on the same key wait for a single
+    invocation instead of each calling the endpoint.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_result_bytes: int, use_redis: bool):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.max_result_bytes = max_result_bytes
+        self.use_redis = use_redis
+        self.redis_hits = 0
+        self.coalesced = 0
+        self._in_flight = {}
+
+    async def get(self, key: str):
+        result = self.memory.get(key)
+        if result is not None or not self.use_redis:
+            return result
+
+        try:
+            cached = await redis_client.get(f"stt:result:{key}")
+        except Exception as e:
+            print(f"Result cache read failed: {e}")
+            return None
+        if cached is None:
+            return None
+
+        self.redis_hits += 1
+        result = json.loads(cached)
+        self.memory.set(key, result)
+        return result
+
+    async def set(self, key: str, result: dict):
+        encoded = json.dumps(result)
+        # Very long transcripts are not worth the memory
+        if len(encoded) > self.max_result_bytes:
+            return
+
+        self.memory.set(key, result)
+        if self.use_redis:
+            try:
+                await redis_client.set(f"stt:result:{key}", encoded, ex=int(self.ttl))
+            except Exception as e:
+                print(f"Result cache write failed: {e}")
+
+    async def get_or_invoke(self, key: str, invoke):
+        """Return the cached result for key, or run invoke() once for all concurrent callers."""
+        result = await self.get(key)
+        if result is not None:
+            return result
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                # Only our own cancellation propagates, a cancelled leader means we invoke ourselves
+                if not in_flight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await invoke()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+        future.set_result(result)
+        await self.set(key, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            **self.memory.stats(),
+            "redis_enabled": self.use_redis,
+            "redis_hits": self.redis_hits,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+result_cache = TranscriptionResultCache(
+    maxsize=settings.RESULT_CACHE_MAX_SIZE,
+    ttl=settings.RESULT_CACHE_TTL_SECONDS,
+    max_result_bytes=settings.RESULT_CACHE_MAX_RESULT_BYTES,
+    use_redis=settings.RESULT_CACHE_REDIS_ENABLED,
+)
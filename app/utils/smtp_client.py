@@ -1,4 +1,8 @@
 import smtplib
+import string
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
@@ -14,31 +18,160 @@ class SMTPClient:
         self.mail_from = mail_from
 
     def send_email(self, subject, body, recipients, html_body=None, attachments=None):
-        # Create a multipart message
-        msg = MIMEMultipart()
-        msg['From'] = self.mail_from
-        msg['To'] = ", ".join(recipients)
-        msg['Subject'] = subject
-
-        # Attach plain text body
-        msg.attach(MIMEText(body, 'plain'))
-
-        # Attach HTML body if provided
-        if html_body:
-            msg.attach(MIMEText(html_body, 'html'))
-
-        # Attach files
-        if attachments:
-            for file_path in attachments:
-                part = MIMEBase('application', 'octet-stream')
-                with open(file_path, 'rb') as attachment:
-                    part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f'attachment; filename={os.path.basename(file_path)}')
-                msg.attach(part)
+        msg = build_message(self.mail_from, subject, body, recipients, html_body, attachments)
 
         # Send the email via SMTP
         with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
             server.starttls()
             server.login(self.username, self.password)
             server.sendmail(self.mail_from, recipients, msg.as_string())
+
+def build_message(mail_from, subject, body, recipients, html_body=None, attachments=None):
+    # Create a multipart message
+    msg = MIMEMultipart()
+    msg['From'] = mail_from
+    msg['To'] = ", ".join(recipients)
+    msg['Subject'] = subject
+
+    # Attach plain text body
+    msg.attach(MIMEText(body, 'plain'))
+
+    # Attach HTML body if provided
+    if html_body:
+        msg.attach(MIMEText(html_body, 'html'))
+
+    # Attach files
+    if attachments:
+        for file_path in attachments:
+            part = MIMEBase('application', 'octet-stream')
+            with open(file_path, 'rb') as attachment:
+                part.set_payload(attachment.read())
+            encoders.encode_base64(part)
+            part.add_header('Content-Disposition', f'attachment; filename={os.path.basename(file_path)}')
+            msg.attach(part)
+
+    return msg
+
+class MessageTemplate:
+    """A message rendered to its wire form once, with $placeholders filled in per send.
+
+    Substitution is only safe while every part stays 7-bit, so non-ASCII values
+    fall back to building the message from scratch.
+    """
+
+    def __init__(self, mail_from, subject, body, html_body=None):
+        self.mail_from = mail_from
+        self.subject = subject
+        self.body = body
+        self.html_body = html_body
+        self._rendered = string.Template(build_message(mail_from, subject, body, ["$to"], html_body).as_string())
+
+    def render(self, recipients, **values) -> str:
+        values["to"] = ", ".join(recipients)
+        if all(str(value).isascii() for value in values.values()):
+            return self._rendered.substitute(values)
+        return build_message(
+            self.mail_from,
+            string.Template(self.subject).substitute(values),
+            string.Template(self.body).substitute(values),
+            recipients,
+            string.Template(self.html_body).substitute(values) if self.html_body else None,
+        ).as_string()
+
+class SMTPConnectionPool:
+    """Authenticated SMTP sessions kept open and reused within one process.
+
+    Idle sessions are closed after idle_timeout and probed with NOOP after
+    keepalive_interval; a session that fails mid-send is discarded and the
+    message retried once on a fresh one. The pool re-initializes itself after a
+    fork, so Celery prefork children never share a socket with their parent.
+    """
+
+    def __init__(self, smtp_server, smtp_port, username, password, use_tls=True, max_size=2, idle_timeout=120, keepalive_interval=30, timeout=30):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        self.connects = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._idle = []  # (connection, last used), most recent last
+        self._pid = os.getpid()
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        self.connects += 1
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def _checkout(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Inherited sockets belong to the parent process
+                self._idle, self._pid = [], os.getpid()
+            while self._idle:
+                connection, last_used = self._idle.pop()
+                idle_for = time.monotonic() - last_used
+                if idle_for > self.idle_timeout:
+                    self._close(connection)
+                    continue
+                if idle_for > self.keepalive_interval:
+                    try:
+                        if connection.noop()[0] != 250:
+                            raise smtplib.SMTPException("NOOP failed")
+                    except (smtplib.SMTPException, OSError):
+                        connection.close()
+                        continue
+                return connection
+        return self._connect()
+
+    def _checkin(self, connection):
+        with self._lock:
+            if len(self._idle) < self.max_size and self._pid == os.getpid():
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._close(connection)
+
+    @contextmanager
+    def session(self):
+        """Borrow one session for several messages; it is discarded if anything fails."""
+        connection = self._checkout()
+        try:
+            yield connection
+        except BaseException:
+            connection.close()
+            raise
+        self._checkin(connection)
+
+    def send(self, mail_from, recipients, message: str):
+        for attempt in range(2):
+            try:
+                with self.session() as connection:
+                    connection.sendmail(mail_from, recipients, message)
+                self.sent += 1
+                return
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+                # A pooled session may have been dropped by the server; retry once on a new one
+                if attempt:
+                    raise
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
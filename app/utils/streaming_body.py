@@ -0,0 +1,150 @@
+import io
+import mmap
+import os
+from contextlib import contextmanager
+
+MULTIPART_BOUNDARY = '----WebKitFormBoundary7MA4YWxkTrZu0gW'
+
+@contextmanager
+def open_upload_buffer(fileobj):
+    """Yield a read-only view over an uploaded file's contents without copying it.
+
+    Starlette spools uploads into a SpooledTemporaryFile: small uploads stay in a
+    BytesIO (exposed through getbuffer), rolled-over uploads live on disk and are
+    mmapped so the kernel page cache backs the body instead of the Python heap.
+    """
+    raw = getattr(fileobj, "_file", fileobj)
+
+    if isinstance(raw, io.BytesIO):
+        view = raw.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+        return
+
+    try:
+        fd = raw.fileno()
+        size = os.fstat(fd).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        # Not backed by a real file, fall back to a single read
+        fileobj.seek(0)
+        yield fileobj.read()
+        return
+
+    if size == 0:
+        yield b""
+        return
+
+    mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        try:
+            mapped.close()
+        except BufferError:
+            # A caller still holds a slice of the mapping, let GC unmap it
+            pass
+
+def retain_buffer(buffer):
+    """Keep an upload's contents readable after open_upload_buffer has exited.
+
+    Mapped uploads stay mapped through a view of their own, so nothing is
+    copied here; in-memory uploads are copied, since the BytesIO cannot be
+    closed while a view of it is alive. Those are under the spool size.
+    """
+    if isinstance(buffer, memoryview) and isinstance(buffer.obj, mmap.mmap):
+        return memoryview(buffer)
+    return bytes(buffer)
+
+def buffer_size(audio) -> int:
+    """Size in bytes of an audio buffer or a sequence of buffers."""
+    parts = audio if isinstance(audio, (list, tuple)) else [audio]
+    return sum(memoryview(part).nbytes for part in parts)
+
+class MultipartBody(io.RawIOBase):
+    """Seekable file-like multipart/form-data body chaining header, audio and footer.
+
+    The audio, a buffer or a sequence of buffers, is referenced through memoryviews,
+    so the body never holds a copy of the upload. Each instance keeps its own read
+    position, which lets botocore hash and rewind it and lets several bodies share
+    the same audio buffer.
+    """
+
+    def __init__(self, audio, filename: str, content_type: str = None, boundary: str = MULTIPART_BOUNDARY):
+        self._init_parts([(audio, filename, content_type)], "file", boundary)
+
+    @classmethod
+    def batch(cls, files: list, boundary: str = MULTIPART_BOUNDARY):
+        """Body carrying several (audio, filename, content_type) files as repeated "files" fields."""
+        body = cls.__new__(cls)
+        body._init_parts(files, "files", boundary)
+        return body
+
+    def _init_parts(self, files: list, field_name: str, boundary: str):
+        super().__init__()
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._parts = []
+        for audio, filename, content_type in files:
+            header = (
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+                f'Content-Type: {content_type or "application/octet-stream"}\r\n\r\n'
+            ).encode()
+            audio_parts = audio if isinstance(audio, (list, tuple)) else [audio]
+            self._parts.append(memoryview(header))
+            self._parts.extend(memoryview(part).cast('B') for part in audio_parts)
+            self._parts.append(memoryview(b'\r\n'))
+        self._parts.append(memoryview(f'--{boundary}--\r\n'.encode()))
+        self._length = sum(len(part) for part in self._parts)
+        self._pos = 0
+
+    def __len__(self):
+        return self._length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._length + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer):
+        target = memoryview(buffer).cast('B')
+        written = 0
+        offset = self._pos
+        for part in self._parts:
+            if written == len(target):
+                break
+            if offset >= len(part):
+                offset -= len(part)
+                continue
+            chunk = part[offset:offset + len(target) - written]
+            target[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            offset = 0
+        self._pos += written
+        return written
+
+    def close(self):
+        for part in self._parts:
+            part.release()
+        super().close()
@@ -0,0 +1,157 @@
+import asyncio
+import numpy as np
+from fastapi import HTTPException, WebSocket
+from app.core.config import settings
+from app.db.schemas import APIKeyPrincipal
+from app.utils.admission import admission_controller
+from app.utils.audio import wav_header
+from app.utils.metrics import AUDIO_SECONDS_PROCESSED
+from app.utils.rate_limiter import rate_limiter
+from app.utils.stt_helpers import invoke_stt_clip
+from app.utils.usage_accumulator import usage_accumulator
+
+BYTES_PER_SAMPLE = 2  # Streams carry 16-bit little-endian mono PCM
+
+class StreamingTranscriber:
+    """Buffers PCM frames from a WebSocket into segments and transcribes them incrementally.
+
+    While a segment grows, partial transcripts of its last
+    STREAM_PARTIAL_WINDOW_SECONDS are pushed every STREAM_PARTIAL_INTERVAL_SECONDS
+    of new audio; they are not billed but count against the audio rate limit,
+    and are skipped once it is spent. A segment is finalized once
+    it ends in silence or reaches STREAM_SEGMENT_MAX_SECONDS; finals are
+    transcribed in order by a single worker task and billed as they complete.
+    At most STREAM_MAX_PENDING_SEGMENTS finals wait for it, after which feed()
+    blocks, so a client sending faster than real time is slowed to the
+    transcription rate instead of queueing audio in memory.
+    """
+
+    def __init__(self, websocket: WebSocket, principal: APIKeyPrincipal, model: str, sample_rate: int):
+        self.websocket = websocket
+        self.principal = principal
+        self.model = model
+        self.sample_rate = sample_rate
+        self.bytes_per_second = sample_rate * BYTES_PER_SAMPLE
+        self.segment = bytearray()
+        self.segment_index = 0
+        self.bytes_since_partial = 0
+        self.partial_task = None
+        self.finals = asyncio.Queue(maxsize=settings.STREAM_MAX_PENDING_SEGMENTS)
+        self.final_worker = asyncio.create_task(self._transcribe_finals())
+
+    def _seconds(self, size: int) -> float:
+        return size / self.bytes_per_second
+
+    def _ends_in_silence(self) -> bool:
+        silence_size = int(settings.STREAM_SILENCE_SECONDS * self.sample_rate) * BYTES_PER_SAMPLE
+        if self._seconds(len(self.segment)) < settings.STREAM_MIN_SEGMENT_SECONDS or len(self.segment) < silence_size:
+            return False
+        tail = np.frombuffer(self.segment, dtype="<i2", count=silence_size // BYTES_PER_SAMPLE, offset=len(self.segment) - silence_size)
+        rms = np.sqrt(np.mean(np.square(tail.astype(np.float32) / 32768)))
+        return rms < settings.STREAM_SILENCE_RMS
+
+    async def _invoke(self, pcm: bytes) -> dict:
+        audio = [wav_header(len(pcm), 1, self.sample_rate, 16), pcm]
+        return await invoke_stt_clip(audio, f"segment-{self.segment_index}.wav", "audio/wav", self.model)
+
+    def _available_balance(self) -> float:
+        return self.principal.balance - usage_accumulator.pending_cost(self.principal.email)
+
+    async def feed(self, pcm: bytes):
+        # Keep whole samples only; a stray byte would shift every following sample
+        self.segment += pcm[:len(pcm) - len(pcm) % BYTES_PER_SAMPLE]
+        self.bytes_since_partial += len(pcm)
+
+        if self._seconds(len(self.segment)) >= settings.STREAM_SEGMENT_MAX_SECONDS or self._ends_in_silence():
+            await self.finalize_segment()
+        elif (
+            self._seconds(self.bytes_since_partial) >= settings.STREAM_PARTIAL_INTERVAL_SECONDS
+            and (self.partial_task is None or self.partial_task.done())
+        ):
+            self.bytes_since_partial = 0
+            window = int(settings.STREAM_PARTIAL_WINDOW_SECONDS * self.sample_rate) * BYTES_PER_SAMPLE
+            self.partial_task = asyncio.create_task(self._send_partial(self.segment_index, bytes(self.segment[-window:])))
+
+    async def _send_partial(self, segment_index: int, pcm: bytes):
+        # Partials are best effort and never queue behind full transcriptions
+        if not admission_controller.try_acquire():
+            return
+        try:
+            if not await rate_limiter.try_debit_audio(self.principal, self._seconds(len(pcm))):
+                return
+            result = await self._invoke(pcm)
+        except Exception as e:
+            print(f"Partial transcription failed: {e}")
+            return
+        finally:
+            admission_controller.release()
+        # A final for this segment supersedes any late partial
+        if segment_index == self.segment_index:
+            await self.websocket.send_json({
+                "type": "partial",
+                "segment": segment_index,
+                "text": result.get("prediction", "").strip(),
+            })
+
+    async def _enqueue(self, item):
+        # Wait for room in the queue, unless the worker has stopped and will never make any
+        put = asyncio.create_task(self.finals.put(item))
+        await asyncio.wait({put, self.final_worker}, return_when=asyncio.FIRST_COMPLETED)
+        put.cancel()
+
+    async def finalize_segment(self):
+        if self.partial_task is not None and not self.partial_task.done():
+            self.partial_task.cancel()
+        pcm = bytes(self.segment)
+        segment_index = self.segment_index
+        self.segment.clear()
+        self.bytes_since_partial = 0
+        self.segment_index += 1
+        if pcm:
+            await self._enqueue((segment_index, pcm))
+
+    async def _transcribe_finals(self):
+        while True:
+            item = await self.finals.get()
+            if item is None:
+                return
+            segment_index, pcm = item
+
+            if self._available_balance() <= 0:
+                await self.websocket.send_json({"type": "error", "detail": "Insufficient balance. Please refill."})
+                await self.websocket.close(code=1008)
+                return
+
+            try:
+                async with admission_controller.slot():
+                    result = await self._invoke(pcm)
+            except HTTPException as e:
+                await self.websocket.send_json({"type": "error", "segment": segment_index, "detail": e.detail})
+                continue
+            except Exception as e:
+                await self.websocket.send_json({"type": "error", "segment": segment_index, "detail": f"Transcription service failed: {str(e)}"})
+                continue
+
+            # Debit each segment as soon as it is transcribed
+            duration = result.get("duration", self._seconds(len(pcm)))
+            usage_accumulator.record(self.principal.email, duration)
+            await rate_limiter.debit_audio(self.principal, duration)
+            AUDIO_SECONDS_PROCESSED.labels(source="stream").inc(duration)
+            await self.websocket.send_json({
+                "type": "final",
+                "segment": segment_index,
+                "text": result.get("prediction", "").strip(),
+                "duration": duration,
+            })
+
+    async def finish(self):
+        """Finalize buffered audio and wait until every final has been sent."""
+        await self.finalize_segment()
+        await self._enqueue(None)
+        await self.final_worker
+
+    async def close(self):
+        # Unsent work is dropped unbilled when the client goes away
+        for task in (self.partial_task, self.final_worker):
+            if task is not None and not task.done():
+                task.cancel()
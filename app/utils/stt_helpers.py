@@ -1,9 +1,18 @@
+import asyncio
+import functools
 import hashlib
-import json
+import io
+import posixpath
 import time
-import uuid
+import zipfile
 from fastapi import HTTPException, UploadFile
+from app.celery.celery import celery_app
 from app.core.config import settings
+from app.utils.batcher import inference_batcher
+from app.utils.inference_router import inference_router
+from app.utils.metrics import INFERENCE_BYTES_SENT, INFERENCE_IN_FLIGHT, time_stage
+from app.utils.resilience import sagemaker_invoker
+from app.utils.streaming_body import MultipartBody, open_upload_buffer
 import secrets
 import string
 
@@ -40,66 +49,116 @@ async def get_file_extension(content_type: str) -> str:
         return ALLOWED_CONTENT_TYPES[content_type]
     raise HTTPException(status_code=400, detail="Unsupported file format")
 
-import io
-
-async def invoke_stt_endpoint(file: UploadFile, sagemaker_runtime):
-    endpoint_name = settings.SAGEMAKER_ENDPOINT_NAME
-
-    # Create a boundary for multipart encoding
-    boundary = '----WebKitFormBoundary7MA4YWxkTrZu0gW'
-    multipart_header = (
-        f'--{boundary}\r\n'
-        f'Content-Disposition: form-data; name="file"; filename="{file.filename}"\r\n'
-        f'Content-Type: {file.content_type or "application/octet-stream"}\r\n\r\n'
-    ).encode()
-
-    boundary_footer = f'\r\n--{boundary}--\r\n'.encode()
-
-    # Use a BytesIO object to concatenate and stream the body
-    body_stream = io.BytesIO()
-    body_stream.write(multipart_header)
-    file.file.seek(0)  # Ensure the file pointer is at the start
-    body_stream.write(file.file.read())  # Write the file content directly to the stream
-    body_stream.write(boundary_footer)
-    
-    # Reset the stream pointer to the beginning
-    body_stream.seek(0)
-
-    # Set the correct Content-Type header
-    content_type = f'multipart/form-data; boundary={boundary}'
-
-    # Pass the BytesIO stream directly to the SageMaker endpoint
-    response = await sagemaker_runtime.invoke_endpoint(
-        EndpointName=endpoint_name,
-        ContentType=content_type,
-        Body=body_stream.getvalue()  # Use the content of the stream as bytes
-    )
-
-    result = json.loads(await response['Body'].read())
-    return result
-
-# Async function to save transcription to S3 using dependency
-async def save_transcription_to_s3(file: UploadFile, transcription_text: str, user_email: str, s3_client):
-    file_extension = await get_file_extension(file.content_type)
-    random_name = str(uuid.uuid4())
-    bucket_name = settings.STT_S3_PAIRS_BUCKET_NAME
-
-    # File paths with appropriate extension
-    audio_file_key = f"{user_email}/{random_name}.{file_extension}"
-    text_file_key = f"{user_email}/{random_name}.txt"
-
-    # Upload audio file directly from UploadFile stream to S3
-    await s3_client.put_object(
-        Bucket=bucket_name,
-        Key=audio_file_key,
-        Body=file.file,
-        ContentType=file.content_type
-    )
-
-    # Upload the transcription text file to S3
-    await s3_client.put_object(
-        Bucket=bucket_name,
-        Key=text_file_key,
-        Body=transcription_text,
-        ContentType='text/plain'
-    )
+ARCHIVE_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+# Methods zipfile can decompress; anything else is rejected before the batch starts
+ZIP_COMPRESSION_METHODS = {zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA}
+
+def open_audio_archive(data: bytes, max_files: int, max_bytes: int) -> list:
+    """List the audio members of a zip upload as (filename, content_type, read).
+
+    Sizes, encryption and compression are checked against the central
+    directory up front. read() decompresses a single member and is called in a
+    thread when that file's turn comes, so a batch never holds every member in
+    memory at once.
+    """
+    extension_types = {extension: content_type for content_type, extension in ALLOWED_CONTENT_TYPES.items()}
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive.")
+    # Skip directories and the metadata macOS adds to archives (__MACOSX/, ._*, .DS_Store)
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not posixpath.basename(info.filename).startswith(".")
+    ]
+    if len(members) > max_files:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {max_files} files.")
+    if sum(info.file_size for info in members) > max_bytes:
+        raise HTTPException(status_code=400, detail="Batch archive is too large once uncompressed.")
+    files = []
+    for info in members:
+        extension = posixpath.splitext(info.filename)[1].lstrip(".").lower()
+        if extension not in extension_types:
+            raise HTTPException(status_code=400, detail=f"Unsupported file format in archive: {info.filename}")
+        if info.flag_bits & 0x1:
+            raise HTTPException(status_code=400, detail="Encrypted zip archives are not supported.")
+        if info.compress_type not in ZIP_COMPRESSION_METHODS:
+            raise HTTPException(status_code=400, detail="Unsupported zip compression method.")
+        files.append((info.filename, extension_types[extension], functools.partial(read_archive_member, archive, info)))
+    return files
+
+def read_archive_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    try:
+        return archive.read(info)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"Corrupt file in archive: {info.filename}")
+
+def upload_key(upload_id: str) -> str:
+    return f"stt:upload:{upload_id}"
+
+async def read_s3_object(s3_client, bucket: str, key: str, size: int, etag: str) -> bytearray:
+    """Download an object with concurrent ranged GETs into one preallocated buffer.
+
+    Every range is pinned to the ETag seen by head_object, so an object
+    overwritten mid-download fails instead of being stitched together.
+    """
+    buffer = bytearray(size)
+    part_size = settings.S3_RANGE_PART_BYTES
+    semaphore = asyncio.Semaphore(settings.S3_RANGE_CONCURRENCY)
+
+    async def read_range(start: int):
+        end = min(start + part_size, size) - 1
+        async with semaphore:
+            response = await s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)
+            buffer[start:end + 1] = await response["Body"].read()
+
+    await asyncio.gather(*(read_range(start) for start in range(0, size, part_size)))
+    return buffer
+
+async def invoke_stt_endpoint(file: UploadFile, model: str = None):
+    # Reference the spooled upload in place instead of copying it into a new buffer
+    with open_upload_buffer(file.file) as audio:
+        return await invoke_stt_clip(audio, file.filename, file.content_type, model)
+
+async def invoke_stt_clip(audio, filename: str, content_type: str, model: str = None):
+    # Short clips can share an invocation with other concurrent requests
+    if inference_batcher.accepts(audio):
+        return await inference_batcher.submit(audio, filename, content_type, model)
+    return await invoke_stt_audio(audio, filename, content_type, model)
+
+async def invoke_stt_audio(audio, filename: str, content_type: str, model: str = None):
+    failed_backends = set()
+
+    async def attempt():
+        # Multipart body streams header, audio and footer without concatenating them;
+        # each attempt gets its own body over the same audio buffer, and may land on another backend
+        with time_stage("build_body"):
+            body = MultipartBody(audio, filename, content_type)
+        try:
+            with INFERENCE_IN_FLIGHT.track_inprogress(), time_stage("inference"):
+                INFERENCE_BYTES_SENT.inc(len(body))
+                return await inference_router.invoke(model, body, failed_backends)
+        finally:
+            body.close()
+
+    return await sagemaker_invoker.call(attempt)
+
+async def get_job_status(job_id: str) -> dict:
+    """Fetch a transcription job's state from the Celery result backend."""
+    loop = asyncio.get_running_loop()
+    meta = await loop.run_in_executor(None, celery_app.backend.get_task_meta, job_id)
+
+    status = meta.get("status", "PENDING")
+    result = meta.get("result")
+    job = {"job_id": job_id, "status": status}
+    if status == "SUCCESS":
+        job.update(result)
+        job["progress"] = 1.0
+    elif status == "PROGRESS" and isinstance(result, dict):
+        job.update(result)
+    elif status == "FAILURE":
+        job["error"] = str(result)
+    return job
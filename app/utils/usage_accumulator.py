@@ -0,0 +1,130 @@
+import asyncio
+import time
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.config import settings
+from app.db.session import db
+from app.utils.auth_cache import apply_balance_deltas
+
+class UsageAccumulator:
+    """Per-worker write-behind buffer for transcription usage and balance debits.
+
+    Debits are merged per user in memory and written with a single unordered
+    bulk_write every flush interval, or sooner once enough users are pending.
+    """
+
+    def __init__(self, flush_interval: float, max_pending_users: int, price_per_second: float):
+        self.flush_interval = flush_interval
+        self.max_pending_users = max_pending_users
+        self.price_per_second = price_per_second
+        self.flushes = 0
+        self.flush_failures = 0
+        self._pending = {}  # email -> [seconds, cost]
+        self._oldest_pending_at = None
+        # The batch being written; still unpaid in the cached balances until the write lands
+        self._in_flight = {}  # email -> cost
+        self._in_flight_since = None
+        self.max_lag_seconds = 0.0
+        self._flush_lock = asyncio.Lock()
+        self._background_flush = None
+
+    def record(self, email: str, duration_seconds: float) -> float:
+        """Queue a debit for the user and return its cost."""
+        cost = duration_seconds * self.price_per_second
+        entry = self._pending.setdefault(email, [0, 0.0])
+        entry[0] += duration_seconds
+        entry[1] += cost
+        if self._oldest_pending_at is None:
+            self._oldest_pending_at = time.monotonic()
+
+        if len(self._pending) >= self.max_pending_users and not self._flush_lock.locked():
+            self._background_flush = asyncio.create_task(self.flush())
+        return cost
+
+    def pending_cost(self, email: str) -> float:
+        """Cost recorded in this worker that has not reached Mongo or the cached balance yet."""
+        entry = self._pending.get(email)
+        return (entry[1] if entry else 0.0) + self._in_flight.get(email, 0.0)
+
+    @property
+    def lag_seconds(self) -> float:
+        """Age of the oldest debit not yet written, including a batch being written."""
+        oldest = [since for since in (self._oldest_pending_at, self._in_flight_since) if since is not None]
+        if not oldest:
+            return 0.0
+        return time.monotonic() - min(oldest)
+
+    def _requeue(self, batch: dict):
+        for email, (seconds, cost) in batch.items():
+            entry = self._pending.setdefault(email, [0, 0.0])
+            entry[0] += seconds
+            entry[1] += cost
+        if self._pending and self._oldest_pending_at is None:
+            self._oldest_pending_at = time.monotonic()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, {}
+            self._in_flight = {email: cost for email, (_, cost) in batch.items()}
+            self._in_flight_since, self._oldest_pending_at = self._oldest_pending_at, None
+            emails = list(batch)
+            operations = [
+                UpdateOne(
+                    {"email": email},
+                    {
+                        "$inc": {
+                            "total_transcription_duration_seconds": batch[email][0],
+                            "balance": -batch[email][1]
+                        }
+                    }
+                )
+                for email in emails
+            ]
+
+            try:
+                await db["users"].bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Unordered writes: only the failed operations need another try
+                failed = {emails[error["index"]] for error in e.details.get("writeErrors", [])}
+                self._requeue({email: batch[email] for email in failed})
+                batch = {email: value for email, value in batch.items() if email not in failed}
+                self.flush_failures += 1
+                print(f"Usage flush partially failed for {len(failed)} users: {e}")
+            except Exception as e:
+                self._requeue(batch)
+                self.flush_failures += 1
+                print(f"Usage flush failed, retrying next interval: {e}")
+                return
+            finally:
+                # From here the debits are either requeued or applied to the cached balances below
+                self.max_lag_seconds = max(self.max_lag_seconds, self.lag_seconds)
+                self._in_flight = {}
+                self._in_flight_since = None
+
+            self.flushes += 1
+            # Flushed debits are now part of the stored balance
+            apply_balance_deltas({email: -cost for email, (_, cost) in batch.items()})
+
+    async def run(self):
+        """Flush on a fixed interval for the application's lifetime."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_users": len(self._pending),
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": max(self.max_lag_seconds, self.lag_seconds),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+        }
+
+usage_accumulator = UsageAccumulator(
+    flush_interval=settings.USAGE_FLUSH_INTERVAL_SECONDS,
+    max_pending_users=settings.USAGE_FLUSH_MAX_PENDING_USERS,
+    price_per_second=settings.PRICE_PER_SECOND,
+)
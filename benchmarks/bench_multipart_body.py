@@ -0,0 +1,69 @@
+"""Peak Python heap usage of the SageMaker request body, legacy vs streaming.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_multipart_body
+"""
+import io
+import os
+import tempfile
+import tracemalloc
+
+from app.utils.streaming_body import MULTIPART_BOUNDARY, MultipartBody, open_upload_buffer
+
+SIZES_MB = [1, 5, 10, 50]
+SPOOL_MAX_SIZE = 1024 * 1024  # Starlette's UploadFile spool threshold
+READ_CHUNK = 2 ** 16          # aiohttp's IOBasePayload read size
+
+def make_upload(size: int):
+    upload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    upload.write(os.urandom(size))
+    upload.seek(0)
+    return upload
+
+def legacy_body(upload):
+    header = f'--{MULTIPART_BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="a.wav"\r\nContent-Type: audio/wav\r\n\r\n'.encode()
+    footer = f'\r\n--{MULTIPART_BOUNDARY}--\r\n'.encode()
+    body_stream = io.BytesIO()
+    body_stream.write(header)
+    upload.seek(0)
+    body_stream.write(upload.read())
+    body_stream.write(footer)
+    body_stream.seek(0)
+    body = body_stream.getvalue()
+    return len(body)
+
+def streaming_body(upload):
+    with open_upload_buffer(upload) as audio:
+        body = MultipartBody(audio, "a.wav", "audio/wav")
+        sent = 0
+        # Drain the body the way the HTTP client would
+        while chunk := body.read(READ_CHUNK):
+            sent += len(chunk)
+        body.close()
+    return sent
+
+def peak_bytes(fn, upload):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn(upload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def main():
+    print(f"{'size':>8} {'spooled':>8} {'legacy peak':>14} {'stream peak':>14}")
+    for size_mb in SIZES_MB:
+        upload = make_upload(size_mb * 1024 * 1024)
+        spooled = "disk" if upload._rolled else "memory"
+        legacy = peak_bytes(legacy_body, upload)
+        streaming = peak_bytes(streaming_body, upload)
+        print(f"{size_mb:>6}MB {spooled:>8} {legacy / 2**20:>12.2f}MB {streaming / 2**20:>12.2f}MB")
+        upload.close()
+
+    small = make_upload(SPOOL_MAX_SIZE // 2)
+    print(f"{'0.5':>6}MB {'memory':>8} {peak_bytes(legacy_body, small) / 2**20:>12.2f}MB {peak_bytes(streaming_body, small) / 2**20:>12.2f}MB")
+    small.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Bytes on the wire and end-to-end latency with and without audio normalization.
+
+End-to-end latency is modelled as normalization time plus upload time to the
+endpoint at --bandwidth-mbps, which is what normalization trades against.
+
+    python -m benchmarks.bench_normalization --bandwidth-mbps 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.audio import wav_header
+from app.utils.audio_normalization import normalize_wav
+
+FORMATS = [
+    # (sample_rate, channels)
+    (48000, 2),
+    (44100, 2),
+    (16000, 1),
+]
+DURATIONS = [10, 30, 60]
+TARGET_RATE = 16000
+
+def make_wav(seconds: int, sample_rate: int, channels: int) -> bytes:
+    t = np.arange(seconds * sample_rate) / sample_rate
+    tone = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * np.random.default_rng(0).standard_normal(t.size)
+    pcm = (np.repeat(tone[:, None], channels, axis=1) * 32767).astype("<i2")
+    return wav_header(pcm.nbytes, channels, sample_rate, 16) + pcm.tobytes()
+
+def transfer_ms(size: int, bandwidth_mbps: float) -> float:
+    return size * 8 / (bandwidth_mbps * 1e6) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bandwidth-mbps", type=float, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'input':>14} {'secs':>5} {'bytes before':>13} {'bytes after':>12} {'ratio':>6} {'normalize':>10} {'e2e before':>11} {'e2e after':>10}")
+    for sample_rate, channels in FORMATS:
+        for seconds in DURATIONS:
+            wav = make_wav(seconds, sample_rate, channels)
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                normalized = normalize_wav(wav, TARGET_RATE)
+                timings.append((time.perf_counter() - started) * 1000)
+            normalize_ms = min(timings)
+            before = transfer_ms(len(wav), args.bandwidth_mbps)
+            after = normalize_ms + transfer_ms(len(normalized), args.bandwidth_mbps)
+            print(
+                f"{sample_rate:>8}Hz x{channels} {seconds:>5} {len(wav):>13} {len(normalized):>12} "
+                f"{len(wav) / len(normalized):>5.1f}x {normalize_ms:>8.1f}ms {before:>9.1f}ms {after:>8.1f}ms"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Pre-flight duration probe cost and accuracy against synthetic WAV, MP3 and WebM files.
+
+The MP3 files are CBR (estimated from the bitrate) or carry a Xing frame
+count; the WebM files either carry a Duration element or, like browser
+MediaRecorder output, only block timestamps read from the last cluster.
+
+    python -m benchmarks.bench_probe --repeat 200
+"""
+import argparse
+import struct
+import time
+
+import numpy as np
+
+from app.utils.audio import wav_header
+from app.utils.audio_probe import probe_audio
+
+DURATIONS = [10, 60, 600, 3600]
+
+def make_wav(seconds: float) -> bytes:
+    data_size = int(seconds * 16000) * 2
+    return wav_header(data_size, 1, 16000, 16) + bytes(data_size)
+
+def make_mp3(seconds: float, xing: bool) -> bytes:
+    # MPEG-1 layer III, 128 kbps, 44.1 kHz, stereo, no padding: 417-byte frames of 1152 samples
+    header = b"\xff\xfb\x90\x00"
+    frames = round(seconds * 44100 / 1152)
+    frame = header + bytes(413)
+    first = frame
+    if xing:
+        first = header + bytes(32) + b"Xing" + struct.pack(">II", 1, frames)
+        first += bytes(417 - len(first))
+    return b"ID3\x04\x00\x00\x00\x00\x02\x00" + bytes(256) + first + frame * (frames - 1)
+
+def ebml(element_id: int, payload: bytes) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") + b"\x01" + len(payload).to_bytes(7, "big") + payload
+
+def make_webm(seconds: float, with_duration: bool) -> bytes:
+    # 20 ms Opus packets, a cluster every 5 seconds, millisecond timecodes
+    rng = np.random.default_rng(0)
+    info = ebml(0x2AD7B1, (1_000_000).to_bytes(3, "big"))
+    if with_duration:
+        info += ebml(0x4489, struct.pack(">d", seconds * 1000))
+    audio = ebml(0xB5, struct.pack(">d", 48000.0)) + ebml(0x9F, b"\x01")
+    track = ebml(0xD7, b"\x01") + ebml(0x86, b"A_OPUS") + ebml(0xE1, audio)
+    clusters = []
+    for cluster_start in range(0, int(seconds * 1000), 5000):
+        blocks = b"".join(
+            ebml(0xA3, b"\x81" + struct.pack(">h", offset) + b"\x80" + rng.bytes(80))
+            for offset in range(0, min(5000, int(seconds * 1000) - cluster_start), 20)
+        )
+        clusters.append(ebml(0x1F43B675, ebml(0xE7, cluster_start.to_bytes(4, "big")) + blocks))
+    header = ebml(0x1A45DFA3, ebml(0x4282, b"webm"))
+    # Live recorders write the segment with an unknown size
+    segment = ebml(0x1549A966, info) + ebml(0x1654AE6B, ebml(0xAE, track)) + b"".join(clusters)
+    return header + b"\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff" + segment
+
+CASES = [
+    ("wav", "audio/wav", make_wav),
+    ("mp3 cbr", "audio/mpeg", lambda seconds: make_mp3(seconds, xing=False)),
+    ("mp3 xing", "audio/mpeg", lambda seconds: make_mp3(seconds, xing=True)),
+    ("webm duration", "audio/webm", lambda seconds: make_webm(seconds, with_duration=True)),
+    ("webm timestamps", "audio/webm", lambda seconds: make_webm(seconds, with_duration=False)),
+]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'input':>16} {'secs':>6} {'bytes':>11} {'probed':>9} {'error':>7} {'best':>9} {'median':>9}")
+    for label, content_type, make in CASES:
+        for seconds in DURATIONS:
+            audio = make(seconds)
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                probe = probe_audio(audio, content_type)
+                timings.append((time.perf_counter() - started) * 1e6)
+            error = (probe.duration - seconds) / seconds * 100
+            print(
+                f"{label:>16} {seconds:>6} {len(audio):>11} {probe.duration:>8.1f}s {error:>+6.2f}% "
+                f"{min(timings):>7.1f}us {float(np.median(timings)):>7.1f}us"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""OTP email throughput against a local SMTP stand-in.
+
+The stand-in delays its greeting by --connect-ms to model TCP, STARTTLS and
+AUTH on a real relay, and every command by --rtt-ms. Messages are sent with a
+fresh connection each (the old behaviour), through the pooled session, and in
+batches over one session, and the cost of building a message from scratch is
+compared with the pre-rendered template.
+
+    python -m benchmarks.bench_smtp --messages 200 --connect-ms 150 --rtt-ms 5
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+from app.celery.tasks import MAIL_FROM, OTP_TEMPLATES
+from app.utils.smtp_client import SMTPConnectionPool, build_message
+
+class SMTPStandIn(socketserver.StreamRequestHandler):
+    connect_delay = 0.0
+    rtt = 0.0
+
+    def reply(self, line: str):
+        time.sleep(self.rtt)
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        time.sleep(self.connect_delay)
+        self.reply("220 stand-in ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 stand-in")
+            elif command == b"DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.messages += 1
+                self.reply("250 queued")
+            elif command == b"QUIT":
+                self.reply("221 bye")
+                return
+            else:  # MAIL, RCPT, NOOP, RSET
+                self.reply("250 ok")
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    messages = 0
+
+def run(label: str, messages: int, send) -> float:
+    started = time.perf_counter()
+    send(messages)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>24} {messages:>6} msgs {elapsed:>8.2f}s {messages / elapsed:>9.1f} msg/s")
+    return messages / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--connect-ms", type=float, default=150)
+    parser.add_argument("--rtt-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    SMTPStandIn.connect_delay = args.connect_ms / 1000
+    SMTPStandIn.rtt = args.rtt_ms / 1000
+    server = StandInServer(("127.0.0.1", 0), SMTPStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+
+    template = OTP_TEMPLATES["email_confirmation"]
+    recipients = [f"user{index}@example.com" for index in range(args.messages)]
+
+    def new_pool(max_size):
+        return SMTPConnectionPool(host, port, None, None, use_tls=False, max_size=max_size)
+
+    def per_connection(count):
+        pool = new_pool(0)  # Nothing is kept, every send connects and quits
+        for email in recipients[:count]:
+            pool.send(MAIL_FROM, [email], template.render([email], otp=123456))
+
+    def pooled(count):
+        pool = new_pool(1)
+        for email in recipients[:count]:
+            pool.send(MAIL_FROM, [email], template.render([email], otp=123456))
+        pool.close()
+
+    def batched(count):
+        pool = new_pool(1)
+        for start in range(0, count, args.batch_size):
+            with pool.session() as connection:
+                for email in recipients[start:start + args.batch_size]:
+                    connection.sendmail(MAIL_FROM, [email], template.render([email], otp=123456))
+        pool.close()
+
+    print(f"stand-in at {host}:{port}, connect {args.connect_ms}ms, rtt {args.rtt_ms}ms")
+    baseline = run("connection per message", min(args.messages, 50), per_connection)
+    for label, send in (("pooled session", pooled), (f"batches of {args.batch_size}", batched)):
+        rate = run(label, args.messages, send)
+        print(f"{'':>24} {rate / baseline:>5.1f}x connection per message")
+
+    renders = 5000
+    started = time.perf_counter()
+    for _ in range(renders):
+        build_message(MAIL_FROM, template.subject, "Your OTP is 123456", ["user@example.com"], template.html_body).as_string()
+    built = (time.perf_counter() - started) / renders * 1e6
+    started = time.perf_counter()
+    for _ in range(renders):
+        template.render(["user@example.com"], otp=123456)
+    rendered = (time.perf_counter() - started) / renders * 1e6
+    print(f"\nmessage build {built:.1f}us, pre-rendered template {rendered:.1f}us")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Silence trimming cost and savings on synthetic call-center style recordings.
+
+Each recording alternates speech-like bursts (a harmonic voiced tone with
+noisy fricative onsets) with line-noise pauses, so about --silence of it is
+silence. Inference time saved is modelled as removed seconds times
+--inference-rtf, the endpoint's seconds of compute per second of audio.
+
+    python -m benchmarks.bench_vad --silence 0.5 --inference-rtf 0.08
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.audio import wav_header
+from app.utils.vad import trim_wav
+
+SAMPLE_RATE = 16000
+DURATIONS = [30, 300, 1800]
+
+def make_call(seconds: int, silence: float, rng) -> tuple:
+    """PCM16 WAV and the (start, end) of every speech burst, in seconds."""
+    t = 0.0
+    pieces, bursts = [], []
+    while t < seconds:
+        speech = rng.uniform(2, 8)
+        pause = speech * silence / (1 - silence)
+        n = int(speech * SAMPLE_RATE)
+        x = np.arange(n) / SAMPLE_RATE
+        pitch = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * x) / k for k in range(1, 6)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * x))
+        voiced[:int(0.08 * SAMPLE_RATE)] = rng.normal(0, 0.15, int(0.08 * SAMPLE_RATE))  # Fricative onset
+        pieces.append(0.2 * voiced)
+        bursts.append((t, t + speech))
+        pieces.append(rng.normal(0, 0.002, int(pause * SAMPLE_RATE)))
+        t += speech + pause
+    samples = np.concatenate(pieces)[:seconds * SAMPLE_RATE]
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    return wav_header(pcm.nbytes, 1, SAMPLE_RATE, 16) + pcm.tobytes(), bursts
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--silence", type=float, default=0.5)
+    parser.add_argument("--inference-rtf", type=float, default=0.08)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'secs':>6} {'kept':>8} {'removed':>8} {'bytes after':>12} {'speech lost':>12} {'map error':>10} {'vad':>8} {'inference saved':>16}")
+    for seconds in DURATIONS:
+        wav, bursts = make_call(seconds, args.silence, rng)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            trimmed, timing_map, original_seconds, kept_seconds = trim_wav(wav)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Every burst's midpoint must survive, and map back to where it was
+        lost, map_error = 0, 0.0
+        for start, end in bursts:
+            middle = (start + end) / 2
+            if middle >= seconds:
+                continue
+            span = next((segment for segment in timing_map.segments if segment[1] <= middle < segment[1] + segment[2]), None)
+            if span is None:
+                lost += 1
+                continue
+            map_error = max(map_error, abs(timing_map.to_original(span[0] + middle - span[1]) - middle))
+
+        removed = original_seconds - kept_seconds
+        print(
+            f"{seconds:>6} {kept_seconds:>7.1f}s {removed / original_seconds:>7.1%} {len(trimmed or wav):>12} "
+            f"{lost:>12} {map_error * 1000:>8.2f}ms {min(timings):>6.1f}ms {removed * args.inference_rtf:>14.1f}s"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""In-process stand-ins for SageMaker, S3 and the Motor users collection.
+
+They implement only the calls the service makes, with enough fidelity for
+load testing: the inference fake reads the whole request body and sleeps for a
+latency drawn from a configurable distribution before answering.
+"""
+import asyncio
+import copy
+import json
+import hashlib
+import random
+from botocore.exceptions import ClientError
+
+class FakeStreamingBody:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def read(self, amt=None):
+        if amt is None:
+            amt = len(self._data)
+        data, self._data = self._data[:amt], self._data[amt:]
+        return data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+def parse_latency(spec: str):
+    """Build a sampler from "fixed:0.2", "uniform:0.1,0.4" or "lognormal:median,sigma"."""
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(0, sigma) * median
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class FakeSageMakerRuntime:
+    """Answers invoke_endpoint like the ASR container, including batched "files" requests."""
+
+    def __init__(self, latency: str = "fixed:0.05", seconds_per_byte: float = 1 / 32000):
+        self.sample_latency = parse_latency(latency)
+        self.seconds_per_byte = seconds_per_byte
+        self.invocations = 0
+        self.bytes_received = 0
+
+    async def invoke_endpoint(self, EndpointName, ContentType, Body, **kwargs):
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        self.invocations += 1
+        self.bytes_received += len(data)
+        await asyncio.sleep(self.sample_latency())
+
+        # Batched requests carry repeated "files" fields and get a list back
+        files = data.count(b'name="files"')
+        result = {"prediction": " benchmark transcription ", "duration": max(1.0, len(data) * self.seconds_per_byte / max(files, 1))}
+        payload = [result] * files if files else result
+        return {"Body": FakeStreamingBody(json.dumps(payload).encode()), "ContentType": "application/json"}
+
+def _not_found(operation: str):
+    return ClientError({"Error": {"Code": "404", "Message": "Not Found"}, "ResponseMetadata": {"HTTPStatusCode": 404}}, operation)
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.content_types = {}
+        self._uploads = {}
+
+    async def put_object(self, Bucket, Key, Body, ContentType=None, **kwargs):
+        self.objects[(Bucket, Key)] = Body.read() if hasattr(Body, "read") else bytes(Body)
+        self.content_types[(Bucket, Key)] = ContentType
+        return {"ETag": '"fake"'}
+
+    async def get_object(self, Bucket, Key, Range=None, **kwargs):
+        if (Bucket, Key) not in self.objects:
+            raise _not_found("GetObject")
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            start, _, end = Range.removeprefix("bytes=").partition("-")
+            data = data[int(start):int(end) + 1 if end else None]
+        return {"Body": FakeStreamingBody(data), "ContentLength": len(data)}
+
+    async def head_object(self, Bucket, Key, **kwargs):
+        if (Bucket, Key) not in self.objects:
+            raise _not_found("HeadObject")
+        data = self.objects[(Bucket, Key)]
+        head = {"ContentLength": len(data), "ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+        if self.content_types.get((Bucket, Key)):
+            head["ContentType"] = self.content_types[(Bucket, Key)]
+        return head
+
+    async def delete_object(self, Bucket, Key, **kwargs):
+        self.objects.pop((Bucket, Key), None)
+
+    async def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"upload-{len(self._uploads)}"
+        self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    async def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        parts = self._uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    async def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._uploads.pop(UploadId, None)
+
+    async def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kwargs):
+        return f"https://fake-s3.local/{Params['Bucket']}/{Params['Key']}"
+
+    async def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=3600):
+        return {"url": f"https://fake-s3.local/{Bucket}", "fields": {**(Fields or {}), "key": Key}}
+
+def _matches(document: dict, query: dict) -> bool:
+    return all(document.get(key) == value for key, value in query.items())
+
+def _project(document: dict, projection):
+    if not projection:
+        return copy.deepcopy(document)
+    fields = projection if isinstance(projection, (list, tuple)) else [key for key, value in projection.items() if value]
+    return {key: copy.deepcopy(document[key]) for key in ["_id", *fields] if key in document}
+
+def _apply_update(document: dict, update: dict):
+    document.update(copy.deepcopy(update.get("$set", {})))
+    for key, value in update.get("$inc", {}).items():
+        document[key] = document.get(key, 0) + value
+    for key in update.get("$unset", {}):
+        document.pop(key, None)
+
+class FakeCollection:
+    """The subset of the Motor collection API the service uses, keyed by exact-match queries."""
+
+    def __init__(self):
+        self.documents = []
+
+    async def find_one(self, query: dict, projection=None, **kwargs):
+        for document in self.documents:
+            if _matches(document, query):
+                return _project(document, projection)
+        return None
+
+    async def insert_one(self, document: dict):
+        document.setdefault("_id", len(self.documents) + 1)
+        self.documents.append(copy.deepcopy(document))
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False, **kwargs):
+        for document in self.documents:
+            if _matches(document, query):
+                _apply_update(document, update)
+                return
+        if upsert:
+            document = dict(query)
+            _apply_update(document, update)
+            self.documents.append(document)
+
+    async def find_one_and_update(self, query: dict, update: dict, projection=None, **kwargs):
+        for document in self.documents:
+            if _matches(document, query):
+                before = _project(document, projection)
+                _apply_update(document, update)
+                return before
+        return None
+
+    async def bulk_write(self, operations: list, ordered: bool = True):
+        for operation in operations:
+            await self.update_one(operation._filter, operation._doc, upsert=bool(operation._upsert))
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = FakeCollection()
+        return collection
@@ -0,0 +1,243 @@
+"""Offline load test of the real app.main:app against local fakes.
+
+The application runs under uvicorn on localhost with SageMaker, S3 and the
+Motor users collection replaced by the in-process fakes in benchmarks.fakes and
+Redis replaced by fakeredis (or a real server via --redis-url). Each flow is
+driven at --concurrency for --requests requests and reported as p50/p95/p99
+latency, requests/sec, errors and peak RSS.
+
+    python -m benchmarks.load_test --flows transcribe,token,register --concurrency 32
+    python -m benchmarks.load_test --json before.json
+    python -m benchmarks.load_test --json after.json --compare before.json
+
+--compare exits non-zero when p95 latency or throughput of any flow regressed
+by more than --threshold percent. Requires httpx and fakeredis[lua], which are
+not service dependencies.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("ENV", "DEV")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("SAGEMAKER_ENDPOINT_NAME", "benchmark-endpoint")
+os.environ.setdefault("STT_S3_PAIRS_BUCKET_NAME", "benchmark-pairs")
+os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:6379/0")
+# Defaults sized for load generation rather than abuse protection
+os.environ.setdefault("RATE_LIMIT_REQUESTS_PER_SECOND", "1000000")
+os.environ.setdefault("RATE_LIMIT_REQUEST_BURST", "1000000")
+os.environ.setdefault("RATE_LIMIT_AUDIO_SECONDS_PER_MINUTE", "1000000000")
+
+import httpx
+import numpy as np
+import uvicorn
+
+from benchmarks.fakes import FakeDatabase, FakeS3Client, FakeSageMakerRuntime
+
+PASSWORD = "Benchmark-Passw0rd!"
+API_KEY_PREFIX = "benchmark-key-"
+
+def install_fakes(args):
+    """Swap the external services for fakes before the application modules bind to them."""
+    import app.db.redis
+    import app.db.session
+    import app.utils.aws_clients as aws_clients
+
+    if not args.redis_url:
+        try:
+            import fakeredis
+        except ImportError:
+            sys.exit("fakeredis[lua] is required unless --redis-url points at a local Redis")
+        app.db.redis.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    else:
+        import redis.asyncio as aioredis
+        app.db.redis.redis_client = aioredis.from_url(args.redis_url, decode_responses=True)
+
+    database = FakeDatabase()
+    app.db.session.db = database
+    sagemaker = FakeSageMakerRuntime(latency=args.latency)
+    s3 = FakeS3Client()
+
+    async def open_fake_clients():
+        aws_clients._clients.update(sagemaker=sagemaker, s3=s3)
+    aws_clients.open_aws_clients = open_fake_clients
+
+    from app.celery.tasks import send_email_confirmation_otp_email
+    send_email_confirmation_otp_email.delay = lambda *args, **kwargs: None
+
+    import app.main
+    return app.main.app, database, sagemaker
+
+async def seed_users(database, count: int):
+    from app.utils.auth_helpers import get_password_hash
+
+    hashed_password = await get_password_hash(PASSWORD)
+    for index in range(count):
+        await database["users"].insert_one({
+            "email": f"user{index}@example.com",
+            "hashed_password": hashed_password,
+            "email_verified": True,
+            "balance": 1e9,
+            "token_version": 0,
+            "total_transcription_duration_seconds": 0,
+            "api_key": hashlib.sha256(f"{API_KEY_PREFIX}{index}".encode()).hexdigest(),
+        })
+
+def make_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    from app.utils.audio import wav_header
+
+    rng = np.random.default_rng(0)
+    pcm = (rng.standard_normal(int(seconds * sample_rate)) * 3000).astype("<i2")
+    return wav_header(pcm.nbytes, 1, sample_rate, 16) + pcm.tobytes()
+
+def build_flows(args):
+    wav = make_wav(args.audio_seconds)
+    transcribe_headers = {} if args.result_cache else {"x-stt-cache": "bypass"}
+
+    async def transcribe(client, index):
+        return await client.post(
+            "/api/v1/stt/transcribe",
+            headers={"x-api-key": f"{API_KEY_PREFIX}{index % args.users}", **transcribe_headers},
+            files={"file": ("audio.wav", wav, "audio/wav")},
+        )
+
+    async def token(client, index):
+        return await client.post(
+            "/api/v1/auth/token",
+            data={"username": f"user{index % args.users}@example.com", "password": PASSWORD},
+        )
+
+    # Registrations need fresh emails across warmup and measured runs
+    registrations = itertools.count()
+
+    async def register(client, index):
+        return await client.post(
+            "/api/v1/auth/register",
+            json={"email": f"new{next(registrations)}@example.com", "password": PASSWORD},
+        )
+
+    return {"transcribe": transcribe, "token": token, "register": register}
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def run_flow(client, request, total: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = {}
+    next_index = iter(range(total))
+
+    async def worker():
+        for index in next_index:
+            started = time.perf_counter()
+            try:
+                response = await request(client, index)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "requests_per_second": total / elapsed,
+        "errors": sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400)),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results: dict, baseline_path: str, threshold: float) -> bool:
+    """Print changes against a previous run; returns True when something regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_path} ({baseline.get('commit', 'unknown')})")
+    regressed = False
+    for flow, result in results.items():
+        before = baseline.get("results", {}).get(flow)
+        if not before:
+            continue
+        p95_change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        rps_change = (result["requests_per_second"] - before["requests_per_second"]) / before["requests_per_second"] * 100
+        flag = p95_change > threshold or rps_change < -threshold
+        regressed |= flag
+        print(f"{flow:>12} p95 {p95_change:>+7.1f}%  req/s {rps_change:>+7.1f}%{'  REGRESSION' if flag else ''}")
+    return regressed
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def main(args):
+    app, database, sagemaker = install_fakes(args)
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    await seed_users(database, args.users)
+    flows = build_flows(args)
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+        print(f"{'flow':>12} {'reqs':>6} {'conc':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9} {'errors':>7} {'peak rss':>9}")
+        for name in args.flows.split(","):
+            await run_flow(client, flows[name], args.warmup, min(args.concurrency, args.warmup or 1))
+            result = results[name] = await run_flow(client, flows[name], args.requests, args.concurrency)
+            print(
+                f"{name:>12} {result['requests']:>6} {result['concurrency']:>5} {result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms "
+                f"{result['p99_ms']:>7.1f}ms {result['requests_per_second']:>9.1f} {result['errors']:>7} {result['peak_rss_mb']:>7.1f}MB"
+            )
+
+    server.should_exit = True
+    await server_task
+    print(f"\nfake endpoint: {sagemaker.invocations} invocations, {sagemaker.bytes_received} bytes received")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"commit": git_commit(), "config": vars(args), "results": results}, f, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flows", default="transcribe,token,register")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--audio-seconds", type=float, default=5)
+    parser.add_argument("--latency", default="lognormal:0.05,0.3", help='fake endpoint latency: "fixed:s", "uniform:a,b" or "lognormal:median,sigma"')
+    parser.add_argument("--result-cache", action="store_true", help="let identical uploads hit the result cache")
+    parser.add_argument("--redis-url", help="use this Redis instead of fakeredis")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="previous --json output to compare against")
+    parser.add_argument("--threshold", type=float, default=10, help="regression threshold in percent")
+    asyncio.run(main(parser.parse_args()))
@@ -3,6 +3,13 @@
 # Calculate the number of workers based on the CPU count
 CPU_COUNT=$(nproc)
 WORKER_COUNT=$((CPU_COUNT * 2 + 1))
+# Lets each worker size its share of machine-wide pools such as password hashing
+export WEB_CONCURRENCY=$WORKER_COUNT
+
+# Workers write metrics here so /metrics aggregates all of them; clear stale samples from previous runs
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 
 # Start Uvicorn with the calculated number of workers
 uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers $WORKER_COUNT
\ No newline at end of file